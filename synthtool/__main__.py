@@ -22,6 +22,7 @@ import pkg_resources
 from synthtool.log import logger
 import synthtool.metadata
 from synthtool import preconfig
+from synthtool.sources import git
 
 try:
     VERSION = pkg_resources.get_distribution("gcp-synthtool").version
@@ -62,8 +63,19 @@ def extra_args() -> List[str]:
     default="synth.metadata",
     help="Path to metadata file that will be read and overwritten.",
 )
+@click.option(
+    "--prefetch",
+    multiple=True,
+    help="Url of a git repo the synth file will clone. Repos given this way "
+    "are fetched concurrently before the synth file runs. May be repeated.",
+)
 @click.argument("extra_args", nargs=-1)
-def main(synthfile: str, metadata: str, extra_args: Sequence[str]):
+def main(
+    synthfile: str,
+    metadata: str,
+    extra_args: Sequence[str],
+    prefetch: Sequence[str] = (),
+):
     f"""Synthesizes source code according to the instructions in synthfile arg.
 
     Optional environment variables:
@@ -72,6 +84,27 @@ def main(synthfile: str, metadata: str, extra_args: Sequence[str]):
       SYNTHTOOL_GENERATOR:       Path to local gapic-generator directory to use for generation.
                 By default, the latest version of gapic-generator will be used.
       AUTOSYNTH_USE_SSH:         Access github repos via ssh instead of https.
+      SYNTHTOOL_GIT_CACHE_TTL:   Seconds during which a fetched git cache is reused
+                without fetching again. Defaults to 0.
+      SYNTHTOOL_GIT_CACHE_WORKTREES: Number of checked out commits kept per git
+                repo in the cache, the least recently used being removed.
+                Defaults to 8, 0 keeps them all.
+      SYNTHTOOL_CACHE_MAX_SIZE:  Size in bytes above which the least recently used
+                entries of ~/.cache/synthtool are evicted. Defaults to 0 (unbounded).
+      SYNTHTOOL_RENDER_JOBS:     Number of templates rendered concurrently by a
+                template group. Defaults to 1.
+      SYNTHTOOL_PERSIST_RENDERS: Keep rendered templates in ~/.cache/synthtool so that
+                later runs can reuse identical renders.
+      SYNTHTOOL_INCREMENTAL_RENDERS: Copy templates whose sources and inputs are
+                unchanged since the last run from the files that run wrote
+                instead of rendering them again.
+      SYNTHTOOL_STEP_CACHE:      Restore the files written by formatters and code
+                generators from ~/.cache/synthtool instead of running them
+                again when their inputs and version are unchanged.
+      SYNTHTOOL_PACKAGE_CACHE:   Skip the post-processing of mono-repo packages whose
+                inputs and files are unchanged since it last succeeded.
+      SYNTHTOOL_FORMAT_WRITTEN_ONLY: Only run the formatters on the files written by
+                synthtool during the run, and skip them if there are none.
       {preconfig.PRECONFIG_ENVIRONMENT_VARIABLE}:  Path to a json file.
 
 
@@ -82,6 +115,9 @@ def main(synthfile: str, metadata: str, extra_args: Sequence[str]):
     synth_file = os.path.abspath(synthfile)
 
     if os.path.lexists(synth_file):
+        if prefetch:
+            git.prefetch(prefetch)
+
         logger.debug(f"Executing {synth_file}.")
         # https://docs.python.org/3/library/importlib.html#importing-a-source-file-directly
         spec = importlib.util.spec_from_file_location("synth", synth_file)
@@ -0,0 +1,126 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Skips the post-processing of unchanged packages.
+
+The result of post-processing a package of a mono-repo only depends on its
+staging directory, the templates, its owlbot.py and post-processing
+configuration, synthtool itself, and the package as it was before. When
+enabled, a fingerprint of these inputs and a hash of the package tree are
+recorded in the ``packages`` namespace of the cache after each successful run.
+The next run with the same fingerprint, on a package that wasn't modified
+since, has nothing to do.
+
+Callers only compute a fingerprint when ENABLED, and pass None otherwise.
+"""
+
+import functools
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Iterable, Optional, Union
+
+import synthtool
+from synthtool import _walk, cache
+
+ENABLED = bool(os.environ.get("SYNTHTOOL_PACKAGE_CACHE", False))
+CACHE_NAMESPACE = "packages"
+
+PathOrStr = Union[str, Path]
+
+
+def _hash_tree(path: PathOrStr) -> str:
+    """Hashes the names, modes and contents of the files below path."""
+    digest = hashlib.sha256()
+    for dirpath, _, filenames in _walk.walk(path):
+        for name in sorted(filenames):
+            file_path = os.path.join(dirpath, name)
+            relpath = os.path.relpath(file_path, path).replace(os.sep, "/")
+            mode = os.lstat(file_path).st_mode
+            if os.path.islink(file_path):
+                content = os.readlink(file_path).encode("utf-8")
+            else:
+                with open(file_path, "rb") as f:
+                    content = f.read()
+            digest.update(cache.make_key(relpath, oct(mode), content).encode())
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_static_tree(path: str) -> str:
+    """Hashes a tree that doesn't change while synthtool runs."""
+    return _hash_tree(path)
+
+
+def _hash_file(path: PathOrStr) -> str:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return ""
+
+
+def fingerprint(
+    *,
+    staging: PathOrStr,
+    templates: Optional[PathOrStr] = None,
+    files: Iterable[PathOrStr] = (),
+    options: Any = None,
+) -> str:
+    """Fingerprints the inputs of a package's post-processing.
+
+    Args:
+        staging: The package's staging directory.
+        templates: The template directory rendered into the package.
+        files: Configuration files, such as owlbot.py.
+        options: Other inputs, serializable to JSON.
+    """
+    parts = [
+        _hash_static_tree(os.path.dirname(synthtool.__file__)),
+        _hash_tree(staging),
+        _hash_static_tree(str(Path(templates).resolve())) if templates else "",
+        json.dumps(options, sort_keys=True, default=str),
+    ]
+    for path in sorted(str(path) for path in files):
+        parts += [path, _hash_file(path)]
+    return cache.make_key(*parts)
+
+
+def _manifest_key(package_dir: PathOrStr) -> str:
+    return cache.make_key(os.path.abspath(package_dir))
+
+
+def is_unchanged(package_dir: PathOrStr, fingerprint: Optional[str]) -> bool:
+    """Returns whether the package was post-processed with the same
+    fingerprint, and wasn't modified since."""
+    if fingerprint is None:
+        return False
+    data = cache.get_bytes(CACHE_NAMESPACE, _manifest_key(package_dir))
+    if data is None:
+        return False
+    manifest = json.loads(data)
+    if manifest["fingerprint"] != fingerprint:
+        return False
+    return manifest["tree"] == _hash_tree(package_dir)
+
+
+def record(package_dir: PathOrStr, fingerprint: Optional[str]) -> None:
+    """Records that the package was successfully post-processed."""
+    if fingerprint is None:
+        return
+    manifest = {"fingerprint": fingerprint, "tree": _hash_tree(package_dir)}
+    cache.put_bytes(
+        CACHE_NAMESPACE, _manifest_key(package_dir), json.dumps(manifest).encode()
+    )
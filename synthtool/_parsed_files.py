@@ -0,0 +1,70 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parsed config files.
+
+Files like .repo-metadata.json and package.json are read many times during a
+run. They are parsed once per version of the file, identified by its mtime and
+size, and callers get their own copy of the result to modify.
+"""
+
+import copy
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Tuple, Union
+
+import yaml
+
+
+_parsed: Dict[Tuple[str, str], Tuple[int, int, Any]] = {}
+_lock = threading.Lock()
+
+
+def _load(path: Union[str, os.PathLike], parser: str, parse: Callable) -> Any:
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = (parser, path)
+    with _lock:
+        cached = _parsed.get(key)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return copy.deepcopy(cached[2])
+
+    with open(path) as f:
+        value = parse(f)
+    with _lock:
+        _parsed[key] = (stat.st_mtime_ns, stat.st_size, value)
+    return copy.deepcopy(value)
+
+
+def load_json(path: Union[str, os.PathLike]) -> Any:
+    """Returns the parsed contents of a JSON file."""
+    return _load(path, "json", json.load)
+
+
+def load_yaml(path: Union[str, os.PathLike]) -> Any:
+    """Returns the parsed contents of a YAML file."""
+    return _load(path, "yaml", lambda f: yaml.load(f, Loader=yaml.SafeLoader))
+
+
+def invalidate(path: Union[str, os.PathLike]) -> None:
+    """Forgets a file that was written to.
+
+    The mtime of a file rewritten with the same size may not change, on file
+    systems with a coarse timestamp resolution.
+    """
+    path = os.path.abspath(path)
+    with _lock:
+        for parser in ("json", "yaml"):
+            _parsed.pop((parser, path), None)
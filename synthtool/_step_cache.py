@@ -0,0 +1,203 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cached post-processing steps.
+
+Formatters and code generators run after templating (gts fix, compileProtos,
+nox -s format, ...) are slow, and what they write only depends on the files
+they read, their command line and the version of the tool. When enabled, run()
+keeps the files a step wrote in the ``steps`` namespace of the cache, and
+restores them instead of running the tool again when all three are unchanged.
+Steps that fail aren't cached.
+"""
+
+import fnmatch
+import functools
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from synthtool import _parsed_files, _walk, cache, shell
+from synthtool.log import logger
+
+ENABLED = bool(os.environ.get("SYNTHTOOL_STEP_CACHE", False))
+CACHE_NAMESPACE = "steps"
+
+_MANIFEST = "manifest.json"
+_FILES = "files"
+
+
+def _list_files(root: str, patterns: Sequence[str]) -> List[str]:
+    """Lists the files below root whose relative path matches a pattern."""
+    files = []
+    for dirpath, _, filenames in _walk.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            relpath = os.path.relpath(path, root).replace(os.sep, "/")
+            if any(fnmatch.fnmatchcase(relpath, p) for p in patterns):
+                if os.path.isfile(path):
+                    files.append(relpath)
+    return sorted(files)
+
+
+def _hash_files(root: str, relpaths: Iterable[str]) -> Dict[str, str]:
+    hashes = {}
+    for relpath in relpaths:
+        with open(os.path.join(root, relpath), "rb") as f:
+            hashes[relpath] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
+
+
+@functools.lru_cache(maxsize=None)
+def get_command_version(*args: str) -> Optional[str]:
+    """Returns the output of a command printing a tool's version, or None if
+    it fails."""
+    try:
+        return shell.run(list(args)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_package_version(package_dir: str) -> Optional[str]:
+    """Returns the version of an installed node package, or None if it isn't
+    installed."""
+    try:
+        return _parsed_files.load_json(os.path.join(package_dir, "package.json"))[
+            "version"
+        ]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _write_output(text: Optional[str]) -> None:
+    """Writes the output of a command as shell.run() would have."""
+    output = shell.get_redirected_output() or sys.stdout
+    output.write(text or "")
+    output.flush()
+
+
+def _restore(entry: str, root: str) -> subprocess.CompletedProcess:
+    with open(os.path.join(entry, _MANIFEST)) as f:
+        manifest = json.load(f)
+    for relpath, mode in manifest["files"].items():
+        path = os.path.join(root, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(os.path.join(entry, _FILES, relpath), path)
+        os.chmod(path, mode)
+        _parsed_files.invalidate(path)
+    for relpath in manifest["removed"]:
+        try:
+            os.remove(os.path.join(root, relpath))
+        except FileNotFoundError:
+            pass
+    return subprocess.CompletedProcess(
+        manifest["args"], manifest["returncode"], manifest["stdout"]
+    )
+
+
+def _save(
+    key: str,
+    root: str,
+    written: Sequence[str],
+    removed: Sequence[str],
+    result: subprocess.CompletedProcess,
+) -> None:
+    with cache.staging(CACHE_NAMESPACE) as temp_path:
+        files = {}
+        for relpath in written:
+            source = os.path.join(root, relpath)
+            dest = temp_path / _FILES / relpath
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, dest)
+            files[relpath] = os.stat(source).st_mode & 0o7777
+        temp_path.mkdir(exist_ok=True)
+        manifest = {
+            "args": [str(arg) for arg in result.args],
+            "returncode": result.returncode,
+            "stdout": result.stdout,
+            "files": files,
+            "removed": list(removed),
+        }
+        (temp_path / _MANIFEST).write_text(json.dumps(manifest))
+        cache.publish(CACHE_NAMESPACE, key, temp_path)
+
+
+def run(
+    args: Sequence[str],
+    *,
+    inputs: Sequence[str],
+    outputs: Optional[Sequence[str]] = None,
+    tool_version: Optional[str] = None,
+    cwd=None,
+    check: bool = True,
+    hide_output: bool = True,
+) -> subprocess.CompletedProcess:
+    """Runs a command with shell.run(), or restores the files it wrote the last
+    time it ran on the same inputs.
+
+    Patterns are matched with fnmatch against paths relative to cwd, so ``*``
+    also matches ``/``. Dependency and build directories are never matched.
+
+    Args:
+        args: The command line.
+        inputs: Patterns of the files the command reads.
+        outputs: Patterns of the files the command writes. Defaults to inputs.
+        tool_version: Identifies the version of the tool. The step is always
+            run when it's unknown.
+        cwd, check, hide_output: See shell.run().
+    """
+    if not ENABLED or tool_version is None:
+        return shell.run(args, cwd=cwd, check=check, hide_output=hide_output)
+
+    root = os.path.abspath(cwd or ".")
+    input_files = _list_files(root, inputs)
+    output_files = input_files if outputs is None else _list_files(root, outputs)
+    before = _hash_files(root, set(input_files) | set(output_files))
+    key = cache.make_key(
+        CACHE_NAMESPACE,
+        json.dumps([str(arg) for arg in args]),
+        tool_version,
+        json.dumps([(relpath, before[relpath]) for relpath in input_files]),
+    )
+    command = " ".join(str(arg) for arg in args)
+
+    entry = cache.get(CACHE_NAMESPACE, key)
+    if entry is not None:
+        try:
+            with cache.lock(entry, shared=True):
+                result = _restore(str(entry), root)
+        except FileNotFoundError:
+            # Evicted by another process in the meantime.
+            pass
+        else:
+            logger.debug(f"Restored the files written by {command} from the cache")
+            if not hide_output:
+                _write_output(result.stdout)
+            return result
+
+    # The output is captured to be written again when the step is restored.
+    result = shell.run(args, cwd=cwd, check=check, hide_output=True)
+    if not hide_output:
+        _write_output(result.stdout)
+    if result.returncode != 0:
+        return result
+    after = _hash_files(root, _list_files(root, outputs or inputs))
+    written = [relpath for relpath in after if before.get(relpath) != after[relpath]]
+    removed = [relpath for relpath in output_files if relpath not in after]
+    _save(key, root, written, removed, result)
+    return result
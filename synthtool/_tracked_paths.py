@@ -18,20 +18,31 @@ This is a bit of a hack.
 """
 
 import pathlib
+import threading
 
 
 _tracked_paths: list[pathlib.Path] = []
+# Packages may be post-processed by several threads.
+_lock = threading.Lock()
 
 
 def add(path):
-    _tracked_paths.append(pathlib.Path(path))
-    # Reverse sort the list, so that the deepest paths get matched first.
-    _tracked_paths.sort(key=lambda s: -len(str(s)))
+    with _lock:
+        _tracked_paths.append(pathlib.Path(path))
+        # Reverse sort the list, so that the deepest paths get matched first.
+        _tracked_paths.sort(key=lambda s: -len(str(s)))
+
+
+def reset():
+    with _lock:
+        _tracked_paths.clear()
 
 
 def relativize(path):
     path = pathlib.Path(path)
-    for tracked_path in _tracked_paths:
+    with _lock:
+        tracked_paths = list(_tracked_paths)
+    for tracked_path in tracked_paths:
         try:
             return path.relative_to(tracked_path)
         except ValueError:
@@ -0,0 +1,35 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Walks the trees of the packages, without their dependencies."""
+
+import os
+from pathlib import Path
+from typing import Iterator, List, Tuple, Union
+
+# Directories that never contain packages: dependencies, build output and
+# virtual environments.
+PRUNED_DIRECTORIES = frozenset(
+    {"node_modules", "build", ".nox", ".tox", ".venv", ".git", "__pycache__"}
+)
+
+
+def walk(top: Union[str, Path]) -> Iterator[Tuple[str, List[str], List[str]]]:
+    """Like os.walk(), but doesn't descend into PRUNED_DIRECTORIES, and walks
+    the directories in sorted order."""
+    for dirpath, dirnames, filenames in os.walk(top):
+        dirnames[:] = sorted(
+            name for name in dirnames if name not in PRUNED_DIRECTORIES
+        )
+        yield dirpath, dirnames, filenames
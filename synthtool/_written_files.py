@@ -0,0 +1,69 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Files written during the run.
+
+move() and replace() record the files they write, which includes the rendered
+templates as they are moved into the repository. With
+SYNTHTOOL_FORMAT_WRITTEN_ONLY set, the formatters are only run on these files,
+the others being left formatted by the previous run.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import List, Set, Union
+
+from synthtool import _walk
+
+FORMAT_WRITTEN_ONLY = bool(os.environ.get("SYNTHTOOL_FORMAT_WRITTEN_ONLY", False))
+
+PathOrStr = Union[str, Path]
+
+_written: Set[str] = set()
+# Guards _written, as the formatters of one package may run while others are
+# still being written.
+_lock = threading.Lock()
+
+
+def add(path: PathOrStr) -> None:
+    """Records that a file was written."""
+    path = os.path.abspath(path)
+    with _lock:
+        _written.add(path)
+
+
+def add_modified_since(directory: PathOrStr, since_ns: int) -> None:
+    """Records the files below directory modified since a time, as returned
+    by time.time_ns(), e.g. by an external tool."""
+    for dirpath, _, filenames in _walk.walk(directory):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                if os.stat(path).st_mtime_ns >= since_ns:
+                    add(path)
+            except FileNotFoundError:
+                pass
+
+
+def get(directory: PathOrStr = ".") -> List[str]:
+    """Returns the absolute paths of the files written below directory."""
+    prefix = os.path.join(os.path.abspath(directory), "")
+    with _lock:
+        return sorted(path for path in _written if path.startswith(prefix))
+
+
+def reset() -> None:
+    with _lock:
+        _written.clear()
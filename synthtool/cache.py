@@ -12,10 +12,265 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""The synthtool cache directory.
+
+The cache is split into namespaces (``git``, ``jinja``, ...), each a directory
+of entries. An entry is a file or a directory named by its key, usually a
+content hash built with make_key(). Entries are published atomically, record
+their last access time in their mtime, and are evicted least recently used
+first once the cache grows beyond SYNTHTOOL_CACHE_MAX_SIZE bytes. Since that
+walks the whole cache, it's done at exit at most once per EVICTION_INTERVAL.
+"""
+
+import atexit
+import contextlib
+import hashlib
+import os
 import pathlib
+import shutil
+import tempfile
+import time
+from typing import Iterator, List, Optional, Tuple, Union
+
+from synthtool.log import logger
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+# Maximum size of the cache in bytes. 0 means unbounded.
+MAX_SIZE = int(os.environ.get("SYNTHTOOL_CACHE_MAX_SIZE", 0))
+
+# Entries used within this many seconds are never evicted, as another process
+# may still be reading them.
+EVICTION_GRACE_PERIOD = 60 * 60
+
+# Seconds between two evictions at exit.
+EVICTION_INTERVAL = 60 * 60
+
+_LOCK_SUFFIX = ".lock"
+_TEMP_PREFIX = ".tmp-"
+# Marks a directory of the cache as a namespace managed by this module.
+_NAMESPACE_MARKER = ".namespace"
+# Records the last eviction at exit in its mtime.
+_EVICTION_STAMP = ".evicted"
+
+_used = False
 
 
 def get_cache_dir() -> pathlib.Path:
     cache_dir = pathlib.Path.home() / ".cache" / "synthtool"
     cache_dir.mkdir(parents=True, exist_ok=True)
     return cache_dir
+
+
+def get_namespace_dir(namespace: str) -> pathlib.Path:
+    """Returns the directory holding the entries of a namespace."""
+    global _used
+    _used = True
+    namespace_dir = get_cache_dir() / namespace
+    marker = namespace_dir / _NAMESPACE_MARKER
+    if not marker.exists():
+        namespace_dir.mkdir(parents=True, exist_ok=True)
+        marker.touch()
+    return namespace_dir
+
+
+def make_key(*parts: Union[str, bytes]) -> str:
+    """Builds a content-addressed key from the given parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") differ.
+        digest.update(str(len(part)).encode("ascii") + b":" + part)
+    return digest.hexdigest()
+
+
+def touch(path: pathlib.Path) -> None:
+    """Records an access to a cache entry."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def get(namespace: str, key: str) -> Optional[pathlib.Path]:
+    """Returns the path of an entry, or None if it isn't cached."""
+    path = get_namespace_dir(namespace) / key
+    if not path.exists():
+        return None
+    touch(path)
+    return path
+
+
+def get_bytes(namespace: str, key: str) -> Optional[bytes]:
+    """Returns the contents of a file entry, or None if it isn't cached."""
+    path = get(namespace, key)
+    if path is None:
+        return None
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        # Evicted by another process in the meantime.
+        return None
+
+
+@contextlib.contextmanager
+def staging(namespace: str) -> Iterator[pathlib.Path]:
+    """Yields a temporary path, in the namespace's directory, to prepare an
+    entry at before publish(). The path doesn't exist yet; create it as a
+    file or a directory. It's removed if it wasn't published."""
+    namespace_dir = get_namespace_dir(namespace)
+    temp_dir = pathlib.Path(tempfile.mkdtemp(prefix=_TEMP_PREFIX, dir=namespace_dir))
+    try:
+        yield temp_dir / "entry"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def publish(namespace: str, key: str, source: pathlib.Path) -> pathlib.Path:
+    """Atomically moves a prepared file or directory into the cache.
+
+    source must be on the same filesystem as the cache, see staging().
+    Readers see either no entry or the complete one. Since keys are content
+    addresses, an existing directory entry is kept as is.
+    """
+    path = get_namespace_dir(namespace) / key
+    try:
+        os.replace(source, path)
+    except OSError:
+        # A non-empty directory can't be replaced. Someone else published it.
+        if not path.is_dir():
+            raise
+    touch(path)
+    return path
+
+
+def put_bytes(namespace: str, key: str, data: bytes) -> pathlib.Path:
+    """Atomically writes a file entry."""
+    with staging(namespace) as temp_path:
+        temp_path.write_bytes(data)
+        return publish(namespace, key, temp_path)
+
+
+@contextlib.contextmanager
+def lock(
+    path: pathlib.Path, shared: bool = False, blocking: bool = True
+) -> Iterator[None]:
+    """Locks an entry of the cache directory against other processes.
+
+    Readers take a shared lock, updaters an exclusive one. The lock is held on
+    a sibling ``{path}.lock`` file, so the entry itself may be created or
+    deleted while holding it. Locks are not reentrant: acquiring the same
+    entry twice from one thread deadlocks. Locking is a no-op on platforms
+    without ``fcntl``.
+
+    Args:
+        path (pathlib.Path): The cache entry to lock.
+        shared (bool): Take a shared lock instead of an exclusive one.
+        blocking (bool): If False, raise BlockingIOError instead of waiting
+            for the lock.
+    """
+    if fcntl is None:  # pragma: no cover
+        yield
+        return
+
+    lock_path = path.with_name(f"{path.name}{_LOCK_SUFFIX}")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+    if not blocking:
+        operation |= fcntl.LOCK_NB
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _size(path: pathlib.Path) -> int:
+    if not path.is_dir() or path.is_symlink():
+        return path.lstat().st_size
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return size
+
+
+def _entries() -> List[Tuple[float, int, pathlib.Path]]:
+    """Lists (last access time, size, path) of every entry in the cache."""
+    entries = []
+    for namespace_dir in get_cache_dir().iterdir():
+        if not (namespace_dir / _NAMESPACE_MARKER).is_file():
+            continue
+        for path in namespace_dir.iterdir():
+            # Skips the marker and staging directories.
+            if path.name.endswith(_LOCK_SUFFIX) or path.name.startswith("."):
+                continue
+            try:
+                entries.append((path.lstat().st_mtime, _size(path), path))
+            except FileNotFoundError:
+                pass
+    return entries
+
+
+def evict(max_size: Optional[int] = None) -> List[pathlib.Path]:
+    """Removes least recently used entries until the cache fits max_size.
+
+    Entries that are locked by another process, or were used during the
+    EVICTION_GRACE_PERIOD, are kept.
+
+    Args:
+        max_size (int): Maximum size in bytes. Defaults to MAX_SIZE.
+
+    Returns:
+        The list of evicted entries.
+    """
+    if max_size is None:
+        max_size = MAX_SIZE
+
+    entries = sorted(_entries())
+    total = sum(size for _, size, _ in entries)
+    evicted = []
+    now = time.time()
+    for accessed, size, path in entries:
+        if total <= max_size:
+            break
+        if now - accessed < EVICTION_GRACE_PERIOD:
+            break
+        try:
+            with lock(path, blocking=False):
+                if path.is_dir() and not path.is_symlink():
+                    shutil.rmtree(path)
+                else:
+                    path.unlink()
+        except BlockingIOError:
+            continue
+        except FileNotFoundError:
+            pass
+        logger.debug(f"Evicted {path} from the cache")
+        total -= size
+        evicted.append(path)
+    return evicted
+
+
+def _evict_at_exit() -> None:
+    if not (MAX_SIZE and _used):
+        return
+    stamp = get_cache_dir() / _EVICTION_STAMP
+    try:
+        if time.time() - stamp.stat().st_mtime < EVICTION_INTERVAL:
+            return
+    except FileNotFoundError:
+        pass
+    stamp.touch()
+    evict()
+
+
+atexit.register(_evict_at_exit)
@@ -12,7 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
 import os
 import re
 import shutil
@@ -23,7 +22,7 @@ from typing import Dict, List, Optional
 import jinja2
 from datetime import date
 
-from synthtool import shell, _tracked_paths
+from synthtool import shell, _parsed_files, _tracked_paths
 from synthtool.gcp import partials
 from synthtool.languages import node, node_mono_repo
 from synthtool.log import logger
@@ -35,20 +34,43 @@ DEFAULT_TEMPLATES_PATH = "synthtool/gcp/templates"
 LOCAL_TEMPLATES: Optional[str] = os.environ.get("SYNTHTOOL_TEMPLATES")
 
 
+def get_default_template_root() -> Path:
+    """Resolves the common templates.
+
+    git.clone() only clones them once per process, and records them in the
+    metadata and tracked paths on every call, which may have been reset since.
+    """
+    if LOCAL_TEMPLATES:
+        logger.debug(f"Using local templates at {LOCAL_TEMPLATES}")
+        return Path(LOCAL_TEMPLATES)
+    templates_git = git.clone(TEMPLATES_URL)
+    return templates_git / DEFAULT_TEMPLATES_PATH
+
+
 class CommonTemplates:
+    """Renders the common templates.
+
+    Instances are cheap: the templates are cloned once per process and the
+    jinja environments are shared, so mono-repos can create one instance,
+    with its own excludes, per package.
+    """
+
     def __init__(self, template_path: Optional[Path] = None):
         if template_path:
             self._template_root = template_path
-        elif LOCAL_TEMPLATES:
-            logger.debug(f"Using local templates at {LOCAL_TEMPLATES}")
-            self._template_root = Path(LOCAL_TEMPLATES)
         else:
-            templates_git = git.clone(TEMPLATES_URL)
-            self._template_root = templates_git / DEFAULT_TEMPLATES_PATH
+            self._template_root = get_default_template_root()
 
-        self._templates = templates.Templates(self._template_root)
+        self._single_templates: Optional[templates.Templates] = None
         self.excludes = []  # type: List[str]
 
+    @property
+    def _templates(self) -> templates.Templates:
+        # Created on first use, as each one allocates an output directory.
+        if self._single_templates is None:
+            self._single_templates = templates.Templates(self._template_root)
+        return self._single_templates
+
     def _generic_library(self, directory: str, relative_dir=None, **kwargs) -> Path:
         # load common repo meta information (metadata that's not language specific).
         if "metadata" in kwargs:
@@ -58,7 +80,13 @@ class CommonTemplates:
             if "samples" not in kwargs["metadata"] or not kwargs["metadata"]["samples"]:
                 self.excludes.append("samples/README.md")
 
-        t = templates.TemplateGroup(self._template_root / directory, self.excludes)
+        # The rendered files end up in the package's directory.
+        destination = (
+            Path(relative_dir or ".") if templates.INCREMENTAL_RENDERS else None
+        )
+        t = templates.TemplateGroup(
+            self._template_root / directory, self.excludes, destination=destination
+        )
 
         if "repository" in kwargs["metadata"] and "repo" in kwargs["metadata"]:
             kwargs["metadata"]["repo"]["default_branch"] = _get_default_branch_name(
@@ -324,7 +352,10 @@ class CommonTemplates:
                 template_root / ".kokoro/presubmit/presubmit.cfg",
                 ret / ".kokoro/presubmit/presubmit.cfg",
             )
-            env = jinja2.Environment(loader=jinja2.FileSystemLoader(str(template_root)))
+            env = jinja2.Environment(
+                loader=jinja2.FileSystemLoader(str(template_root)),
+                bytecode_cache=templates.bytecode_cache(),
+            )
             tmpl = env.get_template(".kokoro/presubmit/system.cfg")
             for v in kwargs["system_test_python_versions"]:
                 nox_session = f"system-{v}"
@@ -433,6 +464,41 @@ class CommonTemplates:
                 metadata["repository_name"] = repo["name"]
 
 
+_VERSION_DIR_PATTERN = "*v[1-9]*"
+_VERSION_DIR_MAX_DEPTH = 4
+
+
+def _find_version_dirs(path: PathOrStr) -> List[str]:
+    """Returns the sorted names of the version directories within path.
+
+    Versions are detected up to a depth of 4 in the directory hierarchy, in a
+    single walk that doesn't descend past the first level containing versions.
+    """
+    level: List[PathOrStr] = [path]
+    for _ in range(_VERSION_DIR_MAX_DEPTH):
+        sub_dirs = []
+        next_level: List[PathOrStr] = []
+        for directory in level:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if not entry.is_dir():
+                                continue
+                        except OSError:
+                            continue
+                        if fnmatch.fnmatchcase(entry.name, _VERSION_DIR_PATTERN):
+                            sub_dirs.append(entry.name)
+                        next_level.append(entry.path)
+            except OSError:
+                continue
+        # Don't proceed to the next level if we've detected versions in this depth level
+        if sub_dirs:
+            return sorted(sub_dirs)
+        level = next_level
+    return []
+
+
 def detect_versions(
     path: str = "./src",
     default_version: Optional[str] = None,
@@ -463,19 +529,13 @@ def detect_versions(
     if not default_version:
         try:
             # Get the `default_version` from ``.repo-metadata.json`.
-            default_version = json.load(open(".repo-metadata.json", "rt")).get(
+            default_version = _parsed_files.load_json(".repo-metadata.json").get(
                 "default_version"
             )
         except FileNotFoundError:
             pass
 
-    # Detect versions up to a depth of 4 in directory hierarchy
-    for level in ("*v[1-9]*", "*/*v[1-9]*", "*/*/*v[1-9]*", "*/*/*/*v[1-9]*"):
-        # Sort the sub directories alphabetically.
-        sub_dirs = sorted([p.name for p in Path(path).glob(level) if p.is_dir()])
-        # Don't proceed to the next level if we've detected versions in this depth level
-        if sub_dirs:
-            break
+    sub_dirs = _find_version_dirs(path)
 
     if sub_dirs:
         # if `default_version` is not specified, return the sorted directories.
@@ -541,11 +601,9 @@ def _load_repo_metadata(
     """
     if relative_dir is not None:
         if os.path.exists(Path(relative_dir, metadata_file).resolve()):
-            with open(Path(relative_dir, metadata_file).resolve()) as f:
-                return json.load(f)
+            return _parsed_files.load_json(Path(relative_dir, metadata_file).resolve())
     elif os.path.exists(metadata_file):
-        with open(metadata_file) as f:
-            return json.load(f)
+        return _parsed_files.load_json(metadata_file)
     return {}
 
 
@@ -13,10 +13,11 @@
 # limitations under the License.
 
 import os
-import yaml
 from pathlib import Path
 from typing import Dict, List
 
+from synthtool import _parsed_files
+
 # these are the default locations to look up
 _DEFAULT_PARTIAL_FILES = [
     ".readme-partials.yml",
@@ -43,6 +44,5 @@ def load_partials(files: List[str] = []) -> Dict:
     for file in files + _DEFAULT_PARTIAL_FILES:
         partials_file = cwd_path / file
         if os.path.exists(partials_file):
-            with open(partials_file) as f:
-                result.update(yaml.load(f, Loader=yaml.SafeLoader))
+            result.update(_parsed_files.load_yaml(partials_file))
     return result
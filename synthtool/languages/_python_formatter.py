@@ -0,0 +1,539 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runs the format session of python noxfiles without nox.
+
+The format session of a noxfile runs isort and black on a list of paths, in a
+virtualenv of its own. format_dirs() reads the commands and paths from each
+noxfile, and runs the installed isort and black once for all the directories
+that share the same configuration, instead of starting nox and creating a
+virtualenv per directory. A directory is formatted by nox when its format
+session isn't understood. When the noxfile pins other versions of the tools
+than installed, they are installed once into a virtualenv kept in the cache,
+shared by all the noxfiles pinning the same versions.
+"""
+
+import ast
+import concurrent.futures
+import functools
+import importlib.metadata
+import io
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    IO,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from synthtool import _step_cache, cache, shell
+from synthtool.log import logger
+
+PathOrStr = Union[str, Path]
+
+# Files read and written by the format session, which is cached by
+# _step_cache.run() when enabled.
+FORMAT_INPUTS = ["*.py", "*.pyi", "pyproject.toml", "setup.cfg", ".isort.cfg"]
+FORMAT_OUTPUTS = ["*.py", "*.pyi"]
+
+_TOOLS = ("isort", "black")
+
+# Virtualenvs with pinned versions of the tools.
+VENV_NAMESPACE = "python-formatters"
+# Written into a virtualenv once the tools are installed.
+_VENV_READY = "synthtool-installed"
+
+# Files configuring isort or black, and the root of a git repository, which
+# bounds the search for configuration.
+_CONFIG_FILES = (
+    "pyproject.toml",
+    "setup.cfg",
+    ".isort.cfg",
+    "tox.ini",
+    ".editorconfig",
+    ".git",
+)
+
+_PIN = re.compile(r"^(?P<tool>[\w-]+)(\[.*\])?==(?P<version>\S+)$")
+
+# Stands for `[path for path in os.listdir(".") if path.endswith(".py")]`.
+_TOP_LEVEL_PYTHON_FILES = object()
+
+
+class _Command(NamedTuple):
+    tool: str
+    flags: Tuple[str, ...]
+    # Relative to the noxfile's directory, or _TOP_LEVEL_PYTHON_FILES.
+    paths: Any
+
+
+class _FormatSession(NamedTuple):
+    commands: List[_Command]
+    # Versions of the tools the session installs, when pinned.
+    pins: Dict[str, str]
+    # The requirements installing the pinned tools, e.g. black[jupyter]==23.7.0.
+    requirements: Dict[str, str]
+
+
+def _is_session_call(node: ast.AST, method: str) -> bool:
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == method
+        and isinstance(node.func.value, ast.Name)
+        and node.func.value.id == "session"
+    )
+
+
+def _is_listdir_comprehension(node: ast.AST) -> bool:
+    return isinstance(node, ast.ListComp) and any(
+        isinstance(call, ast.Call)
+        and isinstance(call.func, ast.Attribute)
+        and call.func.attr == "listdir"
+        for call in ast.walk(node)
+    )
+
+
+def _parse_format_session(noxfile: PathOrStr) -> Optional[_FormatSession]:
+    """Returns the commands run by the format session of a noxfile, or None if
+    they can't be determined."""
+    try:
+        tree = ast.parse(Path(noxfile).read_text())
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+    values: Dict[str, Any] = {}
+    session = None
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == "format":
+            session = node
+        elif (
+            isinstance(node, ast.Assign)
+            and len(node.targets) == 1
+            and isinstance(node.targets[0], ast.Name)
+        ):
+            try:
+                values[node.targets[0].id] = ast.literal_eval(node.value)
+            except ValueError:
+                pass
+    if session is None:
+        return None
+
+    commands = []
+    pins = {}
+    requirements = {}
+    for statement in session.body:
+        if isinstance(statement, ast.Expr) and isinstance(
+            statement.value, ast.Constant
+        ):
+            continue  # The docstring.
+        if isinstance(statement, ast.Assign):
+            if len(statement.targets) != 1 or not isinstance(
+                statement.targets[0], ast.Name
+            ):
+                return None
+            name = statement.targets[0].id
+            if _is_listdir_comprehension(statement.value):
+                values[name] = _TOP_LEVEL_PYTHON_FILES
+                continue
+            try:
+                values[name] = ast.literal_eval(statement.value)
+            except ValueError:
+                return None
+            continue
+        if not isinstance(statement, ast.Expr):
+            return None
+        call = statement.value
+        if not isinstance(call, ast.Call) or call.keywords:
+            return None
+        args: List[Any] = []
+        for arg in call.args:
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                args.append(arg.value)
+            elif isinstance(arg, ast.Name) and isinstance(values.get(arg.id), str):
+                args.append(values[arg.id])
+            elif isinstance(arg, ast.Starred) and isinstance(arg.value, ast.Name):
+                args.append(values.get(arg.value.id))
+            else:
+                return None
+        if _is_session_call(call, "install"):
+            for requirement in args:
+                match = _PIN.match(str(requirement))
+                if match:
+                    pins[match.group("tool")] = match.group("version")
+                    requirements[match.group("tool")] = str(requirement)
+        elif _is_session_call(call, "run"):
+            if not args or args[0] not in _TOOLS:
+                return None
+            flags: List[str] = []
+            paths: Any = []
+            for value in args[1:]:
+                if isinstance(value, str) and value.startswith("-"):
+                    flags.append(value)
+                elif isinstance(value, str) and isinstance(paths, list):
+                    paths.append(value)
+                elif value is _TOP_LEVEL_PYTHON_FILES and not paths:
+                    paths = _TOP_LEVEL_PYTHON_FILES
+                elif isinstance(value, list) and isinstance(paths, list):
+                    if not all(isinstance(path, str) for path in value):
+                        return None
+                    paths.extend(value)
+                else:
+                    return None
+            commands.append(_Command(args[0], tuple(flags), paths))
+        else:
+            return None
+    return _FormatSession(commands, pins, requirements)
+
+
+def _get_installed_version(tool: str) -> Optional[str]:
+    try:
+        return importlib.metadata.version(tool)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _get_venv_python(requirements: Tuple[str, ...]) -> Optional[str]:
+    """Returns the interpreter of a virtualenv of the cache with requirements
+    installed, creating it the first time, or None if they can't be
+    installed."""
+    entry = cache.get_namespace_dir(VENV_NAMESPACE) / cache.make_key(
+        sys.version, *requirements
+    )
+    python = entry / "bin" / "python"
+    with cache.lock(entry):
+        if not (entry / _VENV_READY).exists():
+            if entry.exists():
+                # Left behind by an interrupted installation.
+                shutil.rmtree(entry)
+            logger.debug(f"Installing {' '.join(requirements)} into {entry}")
+            try:
+                shell.run([sys.executable, "-m", "venv", str(entry)])
+                shell.run([str(python), "-m", "pip", "install", *requirements])
+            except (OSError, subprocess.CalledProcessError):
+                logger.warning(f"Failed to install {' '.join(requirements)}")
+                return None
+            (entry / _VENV_READY).write_text("")
+        cache.touch(entry)
+    return str(python)
+
+
+def _get_python(session: _FormatSession, no_venv: bool) -> Optional[str]:
+    """Returns the interpreter to run the session's tools with, or None if
+    the session must be run by nox."""
+    tools = sorted({command.tool for command in session.commands})
+    versions = {tool: _get_installed_version(tool) for tool in tools}
+    if None not in versions.values() and (
+        no_venv
+        or all(
+            session.pins.get(tool, versions[tool]) == versions[tool] for tool in tools
+        )
+    ):
+        return sys.executable
+    if no_venv or not all(tool in session.requirements for tool in tools):
+        # nox would run tools that aren't installed, or unpinned versions.
+        return None
+    return _get_venv_python(tuple(session.requirements[tool] for tool in tools))
+
+
+def _get_tool_version(python: str, tool: str) -> Optional[str]:
+    if python == sys.executable:
+        return _get_installed_version(tool)
+    return _step_cache.get_command_version(python, "-m", tool, "--version")
+
+
+def get_format_tool_version() -> Optional[str]:
+    """Identifies the installed nox, black and isort run by the format
+    session without a virtualenv."""
+    versions = [
+        _step_cache.get_command_version("nox", "--version"),
+        _step_cache.get_command_version(sys.executable, "-m", "black", "--version"),
+        _step_cache.get_command_version(sys.executable, "-m", "isort", "--version"),
+    ]
+    if None in versions:
+        return None
+    return "\n".join(str(version) for version in versions)
+
+
+def _get_config_dir(directory: str, root: str) -> str:
+    """Returns the closest directory, from directory up to root, where isort
+    and black find their configuration."""
+    path = directory
+    while True:
+        if any(os.path.lexists(os.path.join(path, name)) for name in _CONFIG_FILES):
+            return path
+        parent = os.path.dirname(path)
+        if path == root or parent == path:
+            return path
+        path = parent
+
+
+def _get_black_excludes(config_dir: str) -> Optional[str]:
+    """Returns a regex of the paths excluded by the black configuration, to
+    apply to the files given explicitly with --force-exclude."""
+    # Black reads the pyproject.toml of the project root, the closest directory
+    # with a .git, .hg or pyproject.toml.
+    directory = config_dir
+    while not os.path.isfile(os.path.join(directory, "pyproject.toml")):
+        parent = os.path.dirname(directory)
+        if (
+            os.path.exists(os.path.join(directory, ".git"))
+            or os.path.isdir(os.path.join(directory, ".hg"))
+            or parent == directory
+        ):
+            return None
+        directory = parent
+
+    try:
+        import tomllib
+    except ImportError:  # pragma: no cover
+        # Installed with black before Python 3.11.
+        import tomli as tomllib  # type: ignore
+
+    try:
+        with open(os.path.join(directory, "pyproject.toml"), "rb") as f:
+            config = tomllib.load(f).get("tool", {}).get("black", {})
+    except (OSError, ValueError):
+        return None
+    patterns = [
+        config[name]
+        for name in ("exclude", "extend-exclude", "force-exclude")
+        if isinstance(config.get(name), str) and config[name]
+    ]
+    if not patterns:
+        return None
+    # Black compiles multi-line patterns as verbose ones, where a comment may
+    # end the last line.
+    return "|".join(
+        f"(?:{pattern}\n)" if "\n" in pattern else f"(?:{pattern})"
+        for pattern in patterns
+    )
+
+
+def _resolve_paths(directory: str, paths: Any) -> List[str]:
+    if paths is _TOP_LEVEL_PYTHON_FILES:
+        paths = sorted(name for name in os.listdir(directory) if name.endswith(".py"))
+    resolved = []
+    for path in paths:
+        path = os.path.normpath(os.path.join(directory, path))
+        # nox would fail on missing paths; there is nothing to format there.
+        if os.path.exists(path):
+            resolved.append(path)
+    return resolved
+
+
+def _select_files(paths: List[str], files: Collection[str]) -> List[str]:
+    """Returns the python files among files that are, or are below, paths."""
+    selected = []
+    for file in files:
+        if not file.endswith((".py", ".pyi")):
+            continue
+        if any(
+            file == path or file.startswith(os.path.join(path, "")) for path in paths
+        ):
+            selected.append(file)
+    return selected
+
+
+def _run_batch(
+    config_dir: str,
+    python: str,
+    commands: Sequence[Tuple[str, Tuple[str, ...]]],
+    paths: Dict[int, List[str]],
+) -> None:
+    for index, (tool, flags) in enumerate(commands):
+        targets = [os.path.relpath(path, config_dir) for path in paths[index]]
+        if not targets:
+            continue
+        # Nested noxfiles may list the same paths.
+        targets = list(dict.fromkeys(targets))
+        inputs = list(_CONFIG_FILES)
+        for target in targets:
+            if target == ".":
+                inputs.append("*")
+            elif os.path.isdir(os.path.join(config_dir, target)):
+                inputs.append(f"{target}/*")
+            else:
+                inputs.append(target)
+        args = [python, "-m", tool, *flags]
+        if tool == "isort":
+            # isort reads the configuration of the current directory.
+            args += ["--settings-path", "."]
+        _step_cache.run(
+            args + targets,
+            inputs=inputs,
+            tool_version=_get_tool_version(python, tool),
+            cwd=config_dir,
+            hide_output=False,
+        )
+
+
+def _run_nox(directory: str, no_venv: bool) -> None:
+    args = ["nox", "-s", "format"]
+    if no_venv:
+        args += ["--no-venv", "--no-install"]
+        tool_version = get_format_tool_version()
+    else:
+        # The noxfile pins the versions of black and isort.
+        tool_version = _step_cache.get_command_version("nox", "--version")
+    _step_cache.run(
+        args,
+        inputs=FORMAT_INPUTS,
+        outputs=FORMAT_OUTPUTS,
+        tool_version=tool_version,
+        cwd=directory,
+        hide_output=False,
+    )
+
+
+def _group_overlapping(targets: Sequence[Collection[str]]) -> List[List[int]]:
+    """Groups the indexes of the jobs whose targets overlap, i.e. are the same
+    path or one is below the other.
+
+    Args:
+        targets: the absolute, normalized paths formatted by each job.
+    """
+    parents = list(range(len(targets)))
+
+    def find(index: int) -> int:
+        while parents[index] != index:
+            index = parents[index]
+        return index
+
+    def union(first: int, second: int) -> None:
+        first, second = find(first), find(second)
+        parents[max(first, second)] = min(first, second)
+
+    owners: Dict[str, int] = {}
+    for index, paths in enumerate(targets):
+        for path in paths:
+            union(index, owners.setdefault(path, index))
+    for path, index in owners.items():
+        parent = os.path.dirname(path)
+        while parent != path:
+            if parent in owners:
+                union(index, owners[parent])
+            path, parent = parent, os.path.dirname(parent)
+
+    groups: Dict[int, List[int]] = {}
+    for index in range(len(targets)):
+        groups.setdefault(find(index), []).append(index)
+    return list(groups.values())
+
+
+def _run_jobs(
+    jobs: Sequence[Callable[[], None]], output: IO[str], lock: threading.Lock
+) -> None:
+    """Runs jobs one after another, writing the output of each to output
+    once it finishes, so that it isn't interleaved with other threads'."""
+    for job in jobs:
+        buffer = io.StringIO()
+        try:
+            with shell.redirect_output(buffer):
+                job()
+        finally:
+            with lock:
+                output.write(buffer.getvalue())
+                output.flush()
+
+
+def format_dirs(
+    directories: Sequence[PathOrStr],
+    no_venv: bool = False,
+    root: PathOrStr = ".",
+    jobs: Optional[int] = None,
+    only: Optional[Collection[str]] = None,
+) -> None:
+    """Runs the format session of the noxfiles in the given directories.
+
+    Args:
+        directories: directories containing a noxfile.py.
+        no_venv: the session would run the installed tools anyway, so their
+            versions needn't match the ones pinned by the noxfile.
+        root: the repository; configuration isn't looked up above it.
+        jobs: number of batches formatted concurrently. Defaults to the number
+            of CPUs. Batches formatting the same files run one after another.
+        only: absolute paths of the files to format, e.g. the ones written
+            during the run. Directories without any are skipped.
+    """
+    root = os.path.abspath(root)
+    batches: Dict[Tuple, Dict[int, List[str]]] = {}
+    nox_dirs = []
+    for directory in directories:
+        directory = os.path.abspath(directory)
+        session = _parse_format_session(os.path.join(directory, "noxfile.py"))
+        python = None if session is None else _get_python(session, no_venv)
+        if session is None or python is None:
+            # The session formats its own list of files.
+            if only is None or _select_files([directory], only):
+                nox_dirs.append(directory)
+            continue
+        config_dir = _get_config_dir(directory, root)
+        commands = []
+        for command in session.commands:
+            flags = command.flags
+            # Applies the exclusions of the configuration to the files given
+            # explicitly.
+            if only is not None and command.tool == "isort":
+                flags += ("--filter-files",)
+            elif only is not None and command.tool == "black":
+                excludes = _get_black_excludes(config_dir)
+                if excludes is not None:
+                    flags += ("--force-exclude", excludes)
+            commands.append((command.tool, flags))
+        key = (config_dir, python, tuple(commands))
+        paths = batches.setdefault(key, {index: [] for index in range(len(commands))})
+        for index, command in enumerate(session.commands):
+            resolved = _resolve_paths(directory, command.paths)
+            if only is not None:
+                resolved = _select_files(resolved, only)
+            paths[index].extend(resolved)
+
+    logger.debug(
+        f"Formatting {len(directories)} directories in {len(batches)} batches, "
+        f"{len(nox_dirs)} with nox"
+    )
+    tasks: List[Callable[[], None]] = []
+    targets: List[List[str]] = []
+    for (config_dir, python, commands), paths in batches.items():
+        tasks.append(functools.partial(_run_batch, config_dir, python, commands, paths))
+        targets.append([path for index in paths for path in paths[index]])
+    for directory in nox_dirs:
+        tasks.append(functools.partial(_run_nox, directory, no_venv))
+        targets.append([directory])
+
+    # Jobs formatting the same files run one after another.
+    output = shell.get_redirected_output() or sys.stdout
+    lock = threading.Lock()
+    with concurrent.futures.ThreadPoolExecutor(jobs or os.cpu_count()) as executor:
+        futures = [
+            executor.submit(_run_jobs, [tasks[index] for index in group], output, lock)
+            for group in _group_overlapping(targets)
+        ]
+        for future in futures:
+            future.result()
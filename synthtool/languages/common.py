@@ -13,8 +13,46 @@
 # limitations under the License.
 
 import json
+import os
 from pathlib import Path
 import re
+import subprocess
+from typing import Collection, List, Optional, Tuple, Union
+
+from synthtool._walk import PRUNED_DIRECTORIES
+
+
+def get_changed_files(repo: Union[str, Path], base_ref: str) -> List[str]:
+    """
+    Lists the files changed since the branch diverged from base_ref.
+
+    A renamed file is listed at both its old and new path, so that the
+    directories it left are changed too. Paths aren't quoted.
+
+    Raises:
+    subprocess.CalledProcessError if git fails, e.g. base_ref is unknown.
+
+    Returns:
+    The paths of the files, relative to repo.
+    """
+    result = subprocess.run(
+        [
+            "git",
+            "-c",
+            "core.quotePath=off",
+            "diff",
+            "--name-only",
+            "--no-renames",
+            "-z",
+            "--relative",
+            f"{base_ref}...",
+        ],
+        cwd=repo,
+        stdout=subprocess.PIPE,
+    )
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, result.args)
+    return [path for path in os.fsdecode(result.stdout).split("\0") if path]
 
 
 def update_library_version(version: str, root_dir: str):
@@ -50,3 +88,57 @@ def get_sample_metadata_files(dir: Path, regex: str = r"snippet_metadata"):
             get_sample_metadata_files(path_object)
 
     return metadata_files
+
+
+def find_dirs(
+    root: Union[str, Path],
+    marker: Optional[str] = None,
+    max_depth: Optional[int] = None,
+    stop_at_match: bool = False,
+    pruned_dirs: Collection[str] = PRUNED_DIRECTORIES,
+) -> List[str]:
+    """
+    Walks the directories below root, without descending into pruned_dirs.
+
+    Args:
+        root: the directory to walk. It isn't returned itself.
+        marker: only return the directories containing a file with this name.
+            By default, every directory is returned.
+        max_depth: don't descend more than this many levels below root.
+        stop_at_match: don't descend into the directories that are returned,
+            e.g. once the root of a package is found.
+        pruned_dirs: names of the directories to skip.
+
+    Returns:
+    The paths of the directories, parents before their children.
+    """
+    found = []
+    # A stack of (directory, depth), popped in the order scandir lists them.
+    stack: List[Tuple[str, int]] = [(str(root), 0)]
+    while stack:
+        path, depth = stack.pop()
+        sub_dirs = []
+        has_marker = False
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in pruned_dirs:
+                                sub_dirs.append(entry.path)
+                        elif entry.name == marker and entry.is_file():
+                            has_marker = True
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+        matched = depth > 0 and (marker is None or has_marker)
+        if matched:
+            found.append(str(Path(path)))
+        if (stop_at_match and matched) or (
+            max_depth is not None and depth >= max_depth
+        ):
+            continue
+        stack.extend((sub_dir, depth + 1) for sub_dir in reversed(sub_dirs))
+    return found
@@ -8,6 +8,7 @@ const yaml = require('js-yaml');
 
 const LIBRARIAN_SCRIPT = 'librarian.js';
 const README_PARTIALS = '.readme-partials.yaml';
+const CONCURRENCY_FLAG = '--concurrency=';
 
 // Small helper function to check if a file exists
 // returns a boolean if it exists or not
@@ -29,12 +30,53 @@ async function checkFileExists(filePath) {
   }
 }
 
+// Resolves the command running a package's binary once, instead of letting
+// npx look it up again for every library. Falls back to npx if the package
+// isn't installed next to this script or in the current directory.
+function resolveBin(packageName) {
+  try {
+    const packageJsonPath = require.resolve(`${packageName}/package.json`, {
+      paths: [__dirname, process.cwd()],
+    });
+    const packageJson = require(packageJsonPath);
+    const bin = typeof packageJson.bin === 'string'
+      ? packageJson.bin
+      : packageJson.bin[packageName];
+    return `node ${path.join(path.dirname(packageJsonPath), bin)}`;
+  } catch (err) {
+    return `npx ${packageName}`;
+  }
+}
+
+// Runs the given function on every item, with at most concurrency running at
+// a time. Resolves to the list of errors, by item, once every item is done.
+async function forEachLimit(items, concurrency, fn) {
+  const errors = new Map();
+  let next = 0;
+  async function worker() {
+    while (next < items.length) {
+      const item = items[next++];
+      try {
+        await fn(item);
+      } catch (err) {
+        errors.set(item, err);
+      }
+    }
+  }
+  const workers = [];
+  for (let i = 0; i < Math.min(concurrency, items.length); i++) {
+    workers.push(worker());
+  }
+  await Promise.all(workers);
+  return errors;
+}
 
-// Main function that only runs the CLI tools including:
+
+// Runs the CLI tools for a library, including:
 // 1. Any custom librarian.js file
 // 2. Runs the generate-readme tool from gapic-node-processing
 // 3. Runs npm run fix (like in the main code)
-async function main(libraryDirectory) {
+async function processLibrary(libraryDirectory, gapicNodeProcessing) {
     console.log(libraryDirectory)
     const librarianCustomScriptPath = path.join(libraryDirectory, LIBRARIAN_SCRIPT);
 
@@ -52,12 +94,12 @@ async function main(libraryDirectory) {
         console.log(`Regenerating README.md in ${libraryDirectory} with ${JSON.stringify(readMePartialsPath)}`);
         if (readmePartialsYaml.introduction) {
             console.log(`Regenerating README.md in ${libraryDirectory} with "${readmePartialsYaml.introduction}"`);
-            const command = `npx gapic-node-processing generate-readme --source-path=${libraryDirectory} --string-to-replace='[//]: # "partials.introduction"' --replacement-string='${readmePartialsYaml.introduction}'`;
+            const command = `${gapicNodeProcessing} generate-readme --source-path=${libraryDirectory} --string-to-replace='[//]: # "partials.introduction"' --replacement-string='${readmePartialsYaml.introduction}'`;
             await exec(command, { cwd: libraryDirectory, stdio: 'inherit' });
         }       
         if (readmePartialsYaml.body) {
             console.log(`Regenerating README.md in ${libraryDirectory} with "${readmePartialsYaml.body}"`);
-            const command = `npx gapic-node-processing generate-readme --source-path=${libraryDirectory} --string-to-replace='[//]: # "partials.body"' --replacement-string='${readmePartialsYaml.body}'`;
+            const command = `${gapicNodeProcessing} generate-readme --source-path=${libraryDirectory} --string-to-replace='[//]: # "partials.body"' --replacement-string='${readmePartialsYaml.body}'`;
             await exec(command, { cwd: libraryDirectory, stdio: 'inherit' });
         }
         console.log('Finished regenerating README');  
@@ -74,4 +116,30 @@ async function main(libraryDirectory) {
     console.log('Finished running npm');
 }
 
-main(...process.argv.slice(2));
\ No newline at end of file
+// Main function that processes every library directory given, e.g.
+//   node node-monorepo-newprocess.js --concurrency=4 packages/a packages/b
+async function main(...args) {
+    let concurrency = 1;
+    const libraryDirectories = [];
+    for (const arg of args) {
+        if (arg.startsWith(CONCURRENCY_FLAG)) {
+            concurrency = Math.max(1, parseInt(arg.slice(CONCURRENCY_FLAG.length), 10) || 1);
+        } else {
+            libraryDirectories.push(arg);
+        }
+    }
+
+    const gapicNodeProcessing = resolveBin('gapic-node-processing');
+    const errors = await forEachLimit(libraryDirectories, concurrency, (libraryDirectory) =>
+        processLibrary(libraryDirectory, gapicNodeProcessing)
+    );
+    for (const [libraryDirectory, err] of errors) {
+        console.error(`Failed to process ${libraryDirectory}`);
+        console.error(err);
+    }
+    if (errors.size) {
+        process.exitCode = 1;
+    }
+}
+
+main(...process.argv.slice(2));
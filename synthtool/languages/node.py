@@ -13,13 +13,16 @@
 # limitations under the License.
 
 import json
+import os
 from jinja2 import FileSystemLoader, Environment
 from pathlib import Path
 import re
-from synthtool import _tracked_paths, gcp, shell, transforms
+import time
+from synthtool import _parsed_files, _step_cache, _tracked_paths, _written_files
+from synthtool import gcp, shell, transforms
 from synthtool.gcp import samples, snippets
 from synthtool.log import logger
-from synthtool.sources import git
+from synthtool.sources import git, templates
 from typing import Any, Dict, List, Optional, Callable
 import logging
 import shutil
@@ -29,6 +32,25 @@ _REQUIRED_FIELDS = ["name", "repository", "engines"]
 _TOOLS_DIRECTORY = "/synthtool"
 _GENERATED_SAMPLES_DIRECTORY = "./samples/generated"
 
+# Files read and written by the formatting and code generation steps, which are
+# cached by _step_cache.run() when enabled.
+FIX_INPUTS = [
+    "*.ts",
+    "*.js",
+    "*.tsx",
+    "*.jsx",
+    "*.json",
+    ".eslintrc*",
+    ".eslintignore",
+    ".prettierrc*",
+    ".prettierignore",
+]
+FIX_OUTPUTS = ["*.ts", "*.js", "*.tsx", "*.jsx"]
+_FIX_EXTENSIONS = (".ts", ".js", ".tsx", ".jsx")
+COMPILE_PROTOS_INPUTS = ["protos/*", "src/*.json", "esm/src/*.json"]
+COMPILE_PROTOS_OUTPUTS = ["protos/*"]
+SAMPLES_FILES = ["samples/*"]
+
 
 def read_metadata():
     """
@@ -37,22 +59,21 @@ def read_metadata():
     Returns:
         data - package.json file as a dict.
     """
-    with open("./package.json") as f:
-        data = json.load(f)
+    data = _parsed_files.load_json("./package.json")
 
-        if not all(key in data for key in _REQUIRED_FIELDS):
-            raise RuntimeError(
-                f"package.json is missing required fields {_REQUIRED_FIELDS}"
-            )
+    if not all(key in data for key in _REQUIRED_FIELDS):
+        raise RuntimeError(
+            f"package.json is missing required fields {_REQUIRED_FIELDS}"
+        )
 
-        repo = git.parse_repo_url(data["repository"])
+    repo = git.parse_repo_url(data["repository"])
 
-        data["repository"] = f'{repo["owner"]}/{repo["name"]}'
-        data["repository_name"] = repo["name"]
-        data["lib_install_cmd"] = f'npm install {data["name"]}'
-        data["engine"] = re.search(r"([0-9][0-9])", data["engines"]["node"]).group()
+    data["repository"] = f'{repo["owner"]}/{repo["name"]}'
+    data["repository_name"] = repo["name"]
+    data["lib_install_cmd"] = f'npm install {data["name"]}'
+    data["engine"] = re.search(r"([0-9][0-9])", data["engines"]["node"]).group()
 
-        return data
+    return data
 
 
 def template_metadata() -> Dict[str, Any]:
@@ -156,7 +177,11 @@ def generate_index_ts(versions: List[str], default_version: str) -> None:
         Path(__file__).parent.parent / "gcp" / "templates" / "node_split_library"
     )
     template_loader = FileSystemLoader(searchpath=str(template_path))
-    template_env = Environment(loader=template_loader, keep_trailing_newline=True)
+    template_env = Environment(
+        loader=template_loader,
+        keep_trailing_newline=True,
+        bytecode_cache=templates.bytecode_cache(),
+    )
     TEMPLATE_FILE = "index.ts.j2"
     index_template = template_env.get_template(TEMPLATE_FILE)
     # render index.ts content
@@ -187,7 +212,8 @@ def typeless_samples_hermetic(hide_output=False):
     OwlBot.py, and must be called from there before calling owlbot_main.
     """
     logger.debug("Run typeless sample bot")
-    shell.run(
+    start = time.time_ns()
+    _step_cache.run(
         [
             f"{_TOOLS_DIRECTORY}/node_modules/.bin/typeless-sample-bot",
             "--outputpath",
@@ -196,9 +222,25 @@ def typeless_samples_hermetic(hide_output=False):
             "samples",
             "--recursive",
         ],
+        inputs=SAMPLES_FILES,
+        tool_version=_step_cache.get_package_version(
+            f"{_TOOLS_DIRECTORY}/node_modules/@google-cloud/typeless-sample-bot"
+        ),
         check=False,
         hide_output=hide_output,
     )
+    if _written_files.FORMAT_WRITTEN_ONLY:
+        _written_files.add_modified_since("samples", start)
+
+
+def get_written_sources(directory) -> List[str]:
+    """Returns the paths, relative to directory, of the sources written below
+    it during the run."""
+    return [
+        os.path.relpath(path, directory)
+        for path in _written_files.get(directory)
+        if path.endswith(_FIX_EXTENSIONS)
+    ]
 
 
 def fix(hide_output=False):
@@ -207,10 +249,19 @@ def fix(hide_output=False):
     Before running fix script, run prelint to install extra dependencies
     for samples, but do not fail if it does not succeed.
     """
+    if _written_files.FORMAT_WRITTEN_ONLY and not get_written_sources("."):
+        logger.debug("No sources were written, skipping fix")
+        return
     logger.debug("Running prelint...")
     shell.run(["npm", "run", "prelint"], check=False, hide_output=hide_output)
     logger.debug("Running fix...")
-    shell.run(["npm", "run", "fix"], hide_output=hide_output)
+    _step_cache.run(
+        ["npm", "run", "fix"],
+        inputs=FIX_INPUTS,
+        outputs=FIX_OUTPUTS,
+        tool_version=_step_cache.get_package_version("node_modules/gts"),
+        hide_output=hide_output,
+    )
 
 
 # TODO: delete these functions if it turns out we no longer
@@ -219,7 +270,16 @@ def fix_hermetic(hide_output=False):
     """
     Fixes the formatting in the current Node.js library. It assumes that gts
     is already installed in a well known location on disk (node_modules/.bin).
+
+    With SYNTHTOOL_FORMAT_WRITTEN_ONLY, only the sources written during the run
+    are fixed.
     """
+    files = []
+    if _written_files.FORMAT_WRITTEN_ONLY:
+        files = get_written_sources(".")
+        if not files:
+            logger.debug("No sources were written, skipping fix")
+            return
     logger.debug("Copy eslint config")
     shell.run(
         ["cp", "-r", "node_modules", "."],
@@ -227,8 +287,11 @@ def fix_hermetic(hide_output=False):
         hide_output=hide_output,
     )
     logger.debug("Running fix...")
-    shell.run(
-        ["node_modules/.bin/gts", "fix"],
+    _step_cache.run(
+        ["node_modules/.bin/gts", "fix", *files],
+        inputs=FIX_INPUTS,
+        outputs=FIX_OUTPUTS,
+        tool_version=_step_cache.get_package_version("node_modules/gts"),
         check=False,
         hide_output=hide_output,
     )
@@ -240,7 +303,13 @@ def compile_protos(hide_output=False):
     compileProtos script from google-gax.
     """
     logger.debug("Compiling protos...")
-    shell.run(["npx", "compileProtos", "src"], hide_output=hide_output)
+    _step_cache.run(
+        ["npx", "compileProtos", "src"],
+        inputs=COMPILE_PROTOS_INPUTS,
+        outputs=COMPILE_PROTOS_OUTPUTS,
+        tool_version=_step_cache.get_package_version("node_modules/google-gax"),
+        hide_output=hide_output,
+    )
 
 
 # TODO: delete these functions if it turns out we no longer
@@ -252,8 +321,11 @@ def compile_protos_hermetic(hide_output=False):
     is already installed in a well known location on disk (node_modules/.bin).
     """
     logger.debug("Compiling protos...")
-    shell.run(
+    _step_cache.run(
         ["node_modules/.bin/compileProtos", "src"],
+        inputs=COMPILE_PROTOS_INPUTS,
+        outputs=COMPILE_PROTOS_OUTPUTS,
+        tool_version=_step_cache.get_package_version("node_modules/google-gax"),
         check=True,
         hide_output=hide_output,
     )
@@ -294,10 +366,9 @@ def write_release_please_config(dirs: list):
 
 
 def check_if_private_package(path: str):
-    with open(Path(path, "package.json"), "r") as f:
-        packageJson = json.load(f)
-        if "private" in packageJson and packageJson["private"] is True:
-            return True
+    packageJson = _parsed_files.load_json(Path(path, "package.json"))
+    if "private" in packageJson and packageJson["private"] is True:
+        return True
     return False
 
 
@@ -314,6 +385,12 @@ def _noop(library: Path) -> None:
 # This determines the current list of APIs
 def walk_through_apiary(dir, glob_to_search_for):
     packages_to_exclude = [r"node_modules"]
+    # Every directory below a path, e.g. src/apis/**/*, is found by walking the
+    # tree without descending into node_modules and build output.
+    root, recursive, pattern = glob_to_search_for.rpartition("/**/")
+    if recursive and pattern == "*" and not any(c in root for c in "*?["):
+        return common.find_dirs(Path(dir, root))
+
     dirs_to_return = []
     for path_object in Path(dir).glob(glob_to_search_for):
         if not path_object.is_file() and not re.search(
@@ -366,7 +443,7 @@ def owlbot_main(
 
     logging.basicConfig(level=logging.DEBUG)
     # Load the default version defined in .repo-metadata.json.
-    default_version = json.load(open(".repo-metadata.json", "rt")).get(
+    default_version = _parsed_files.load_json(".repo-metadata.json").get(
         "default_version"
     )
     staging = Path("owl-bot-staging")
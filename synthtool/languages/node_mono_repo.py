@@ -12,22 +12,29 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import argparse
+import concurrent.futures
+import io
 import json
+import os
 from jinja2 import FileSystemLoader, Environment
-from pathlib import Path
+from pathlib import Path, PurePosixPath
 import re
 import sys
 import subprocess
+import threading
+import time
 from synthtool import shell, transforms
 from synthtool.gcp import samples, snippets
 from synthtool.log import logger
-from synthtool.sources import git
-from typing import Any, Dict, List, Optional, Callable
+from synthtool.sources import git, templates
+from typing import Any, Dict, List, Optional, Callable, Tuple
 import shutil
-from synthtool.languages import common
+from synthtool.languages import common, node
 from datetime import date
 import logging
-from synthtool import _tracked_paths
+from synthtool import _package_cache, _parsed_files, _step_cache, _tracked_paths
+from synthtool import _written_files
 from synthtool import gcp
 
 _REQUIRED_FIELDS = ["name", "repository", "engines"]
@@ -44,44 +51,41 @@ def read_metadata(relative_dir: str):
     Returns:
         data - package.json file as a dict.
     """
-    with open(Path(relative_dir, "./package.json").resolve()) as f:
-        data = json.load(f)
+    data = _parsed_files.load_json(Path(relative_dir, "./package.json").resolve())
 
-        if not all(key in data for key in _REQUIRED_FIELDS):
-            raise RuntimeError(
-                f"package.json is missing required fields {_REQUIRED_FIELDS}"
-            )
-
-        repo_url = (
-            data["repository"]
-            if isinstance(data["repository"], str)
-            else data["repository"]["url"]
+    if not all(key in data for key in _REQUIRED_FIELDS):
+        raise RuntimeError(
+            f"package.json is missing required fields {_REQUIRED_FIELDS}"
         )
 
-        repo = git.parse_repo_url(repo_url)
-        data["directory_path"] = (
-            data["repository"]
-            if isinstance(data["repository"], str)
-            else f'{data["repository"]["directory"]}'
-        )
-        data["full_directory_path"] = (
-            data["repository"]
-            if isinstance(data["repository"], str)
-            else f'{repo["owner"]}/{repo["name"]}/{data["directory_path"]}'
-        )
-        data["homepage"] = (
-            data["repository"]
-            if isinstance(data["repository"], str)
-            else data["homepage"]
-        )
-        data["repository"] = f'{repo["owner"]}/{repo["name"]}'
-        data["repository_name"] = repo["name"]
-        data["lib_install_cmd"] = f'npm install {data["name"]}'
-        engines_field = re.search(r"([0-9][0-9])", data["engines"]["node"])
-        assert engines_field is not None
-        data["engine"] = engines_field.group()
+    repo_url = (
+        data["repository"]
+        if isinstance(data["repository"], str)
+        else data["repository"]["url"]
+    )
+
+    repo = git.parse_repo_url(repo_url)
+    data["directory_path"] = (
+        data["repository"]
+        if isinstance(data["repository"], str)
+        else f'{data["repository"]["directory"]}'
+    )
+    data["full_directory_path"] = (
+        data["repository"]
+        if isinstance(data["repository"], str)
+        else f'{repo["owner"]}/{repo["name"]}/{data["directory_path"]}'
+    )
+    data["homepage"] = (
+        data["repository"] if isinstance(data["repository"], str) else data["homepage"]
+    )
+    data["repository"] = f'{repo["owner"]}/{repo["name"]}'
+    data["repository_name"] = repo["name"]
+    data["lib_install_cmd"] = f'npm install {data["name"]}'
+    engines_field = re.search(r"([0-9][0-9])", data["engines"]["node"])
+    assert engines_field is not None
+    data["engine"] = engines_field.group()
 
-        return data
+    return data
 
 
 def copy_list_sample_to_quickstart(relative_dir: str):
@@ -290,7 +294,11 @@ def generate_index_ts(
     )
 
     template_loader = FileSystemLoader(searchpath=str(template_path))
-    template_env = Environment(loader=template_loader, keep_trailing_newline=True)
+    template_env = Environment(
+        loader=template_loader,
+        keep_trailing_newline=True,
+        bytecode_cache=templates.bytecode_cache(),
+    )
     TEMPLATE_FILE = "index.ts.j2"
     index_template = template_env.get_template(TEMPLATE_FILE)
     # render index.ts content
@@ -326,7 +334,8 @@ def typeless_samples_hermetic(hide_output=False):
     OwlBot.py, and must be called from there before calling owlbot_main.
     """
     logger.debug("Run typeless sample bot")
-    shell.run(
+    start = time.time_ns()
+    _step_cache.run(
         [
             f"{_TOOLS_DIRECTORY}/node_modules/.bin/typeless-sample-bot",
             "--outputpath",
@@ -335,9 +344,15 @@ def typeless_samples_hermetic(hide_output=False):
             "samples",
             "--recursive",
         ],
+        inputs=node.SAMPLES_FILES,
+        tool_version=_step_cache.get_package_version(
+            f"{_TOOLS_DIRECTORY}/node_modules/@google-cloud/typeless-sample-bot"
+        ),
         check=False,
         hide_output=hide_output,
     )
+    if _written_files.FORMAT_WRITTEN_ONLY:
+        _written_files.add_modified_since("samples", start)
 
 
 def fix(hide_output=False):
@@ -346,31 +361,73 @@ def fix(hide_output=False):
     Before running fix script, run prelint to install extra dependencies
     for samples, but do not fail if it does not succeed.
     """
+    if _written_files.FORMAT_WRITTEN_ONLY and not node.get_written_sources("."):
+        logger.debug("No sources were written, skipping fix")
+        return
     logger.debug("Running prelint...")
     shell.run(["npm", "run", "prelint"], check=False, hide_output=hide_output)
     logger.debug("Running fix...")
-    shell.run(["npm", "run", "fix"], hide_output=hide_output)
+    _step_cache.run(
+        ["npm", "run", "fix"],
+        inputs=node.FIX_INPUTS,
+        outputs=node.FIX_OUTPUTS,
+        tool_version=_step_cache.get_package_version("node_modules/gts"),
+        hide_output=hide_output,
+    )
 
 
 def fix_hermetic(relative_dir, hide_output=False):
     """
     Fixes the formatting in the current Node.js library. It assumes that gts
     is already installed in a well known location on disk (node_modules/.bin).
+
+    The eslint config and plugins are found through a node_modules symlink to
+    the tools, removed afterwards. They are copied instead if the library has
+    its own node_modules.
+
+    With SYNTHTOOL_FORMAT_WRITTEN_ONLY, only the sources written during the run
+    are fixed.
     """
-    logger.debug("Copy eslint config")
-    shell.run(
-        ["cp", "-r", f"{_TOOLS_DIRECTORY}/node_modules", "."],
-        cwd=relative_dir,
-        check=True,
-        hide_output=hide_output,
-    )
-    logger.debug("Running fix...")
-    shell.run(
-        [f"{_TOOLS_DIRECTORY}/node_modules/.bin/gts", "fix"],
-        cwd=relative_dir,
-        check=False,
-        hide_output=hide_output,
-    )
+    files = []
+    if _written_files.FORMAT_WRITTEN_ONLY:
+        files = node.get_written_sources(relative_dir)
+        if not files:
+            logger.debug("No sources were written, skipping fix")
+            return
+    node_modules = Path(relative_dir, "node_modules")
+    if node_modules.is_symlink():
+        # Left behind by an interrupted run.
+        node_modules.unlink()
+    link_node_modules = not os.path.lexists(node_modules)
+    if link_node_modules:
+        logger.debug("Link eslint config")
+        node_modules.symlink_to(
+            f"{_TOOLS_DIRECTORY}/node_modules", target_is_directory=True
+        )
+    else:
+        logger.debug("Copy eslint config")
+        shell.run(
+            ["cp", "-r", f"{_TOOLS_DIRECTORY}/node_modules", "."],
+            cwd=relative_dir,
+            check=True,
+            hide_output=hide_output,
+        )
+    try:
+        logger.debug("Running fix...")
+        _step_cache.run(
+            [f"{_TOOLS_DIRECTORY}/node_modules/.bin/gts", "fix", *files],
+            inputs=node.FIX_INPUTS,
+            outputs=node.FIX_OUTPUTS,
+            tool_version=_step_cache.get_package_version(
+                f"{_TOOLS_DIRECTORY}/node_modules/gts"
+            ),
+            cwd=relative_dir,
+            check=False,
+            hide_output=hide_output,
+        )
+    finally:
+        if link_node_modules:
+            node_modules.unlink()
 
 
 def compile_protos(hide_output=False, is_esm=False):
@@ -384,7 +441,13 @@ def compile_protos(hide_output=False, is_esm=False):
         if not is_esm
         else ["npx", "compileProtos", "esm/src", "--esm"]
     )
-    shell.run(command, hide_output=hide_output)
+    _step_cache.run(
+        command,
+        inputs=node.COMPILE_PROTOS_INPUTS,
+        outputs=node.COMPILE_PROTOS_OUTPUTS,
+        tool_version=_step_cache.get_package_version("node_modules/google-gax"),
+        hide_output=hide_output,
+    )
 
 
 def compile_protos_hermetic(relative_dir, is_esm=False, hide_output=False):
@@ -399,8 +462,13 @@ def compile_protos_hermetic(relative_dir, is_esm=False, hide_output=False):
         if not is_esm
         else [f"{_TOOLS_DIRECTORY}/node_modules/.bin/compileProtos", "esm/src", "--esm"]
     )
-    shell.run(
+    _step_cache.run(
         command,
+        inputs=node.COMPILE_PROTOS_INPUTS,
+        outputs=node.COMPILE_PROTOS_OUTPUTS,
+        tool_version=_step_cache.get_package_version(
+            f"{_TOOLS_DIRECTORY}/node_modules/google-gax"
+        ),
         cwd=relative_dir,
         check=True,
         hide_output=hide_output,
@@ -441,36 +509,122 @@ def get_destination_folder(package_name: str, base_dir: Path) -> Optional[str]:
     return None
 
 
+def _get_changed_files(base_dir: Path) -> List[str]:
+    """Returns the files, relative to base_dir, changed since the branch
+    diverged from main."""
+    try:
+        return common.get_changed_files(base_dir, "main")
+    except subprocess.CalledProcessError:
+        logger.info("Could not diff against main; no package has changed.")
+        return []
+
+
+def _select_changed_dirs(
+    base_dir: Path, owlbot_dirs: List[str], changed_files: List[str]
+) -> List[str]:
+    """Returns the owlbot_dirs containing any of the changed files."""
+    # Index the package roots by path, then look up the parents of each
+    # changed file instead of comparing every file with every package.
+    roots = {Path(d).relative_to(base_dir).as_posix(): d for d in owlbot_dirs}
+    changed_roots = set()
+    for changed_file in changed_files:
+        for parent in PurePosixPath(changed_file).parents:
+            if parent.as_posix() in roots:
+                changed_roots.add(roots[parent.as_posix()])
+    return [d for d in owlbot_dirs if d in changed_roots]
+
+
 def find_owlbot_dirs_in_sub_dir(
     base_dir: Path,
     sub_dir: str,
     packages_to_exclude: List[str],
     search_for_changed_files: bool,
+    changed_files: Optional[List[str]] = None,
 ) -> List[str]:
+    """Finds the packages in sub_dir.
+
+    If search_for_changed_files, only the packages containing changed_files
+    are returned. They default to the files changed since the branch diverged
+    from main.
+    """
     owlbot_dirs = []
-    for path_object in base_dir.glob(f"{sub_dir}/**/.OwlBot.yaml"):
-        if path_object.is_file() and not re.search(
-            "(?:% s)" % "|".join(packages_to_exclude), str(Path(path_object))
+    # Some packages contain the .OwlBot.yaml of others, e.g. test fixtures, so
+    # the walk descends into packages too.
+    for package_dir in common.find_dirs(base_dir / sub_dir, marker=".OwlBot.yaml"):
+        if not re.search(
+            "(?:% s)" % "|".join(packages_to_exclude),
+            str(Path(package_dir, ".OwlBot.yaml")),
         ):
-            if search_for_changed_files:
-                if (
-                    subprocess.run(
-                        [
-                            "git",
-                            "diff",
-                            "--quiet",
-                            "main...",
-                            Path(path_object).parents[0],
-                        ]
-                    ).returncode
-                    == 1
-                ):
-                    owlbot_dirs.append(str(Path(path_object).parents[0]))
-            else:
-                owlbot_dirs.append(str(Path(path_object).parents[0]))
+            owlbot_dirs.append(package_dir)
+    if search_for_changed_files:
+        if changed_files is None:
+            changed_files = _get_changed_files(base_dir)
+        owlbot_dirs = _select_changed_dirs(base_dir, owlbot_dirs, changed_files)
     return owlbot_dirs
 
 
+def _fetch_main() -> None:
+    try:
+        # Need to run this step first in the post processor since we only clone
+        # the branch the PR is on in the Docker container
+        output = subprocess.run(["git", "fetch", "origin", "main:main", "--deepen=200"])
+        output.check_returncode()
+    except subprocess.CalledProcessError as e:
+        if e.returncode == 128:
+            logger.info(f"Error: ${e.output}; skipping fetching main")
+        else:
+            raise e
+
+
+def _find_staged_dirs(dir: Path) -> List[str]:
+    """Returns the destinations of the packages in owl-bot-staging."""
+    staged_dirs = []
+    for path_object in dir.glob("owl-bot-staging/*"):
+        package_name = Path(path_object).name
+        destination_folder = get_destination_folder(package_name, dir)
+        if destination_folder is None:
+            raise RuntimeError(f"Can't find package {package_name} in subdirectories")
+        staged_dirs.append(
+            f"{Path(path_object).parents[1]}/{destination_folder}/{package_name}"
+        )
+    return staged_dirs
+
+
+_PACKAGES_TO_EXCLUDE = [
+    r"packages/gapic-node-processing/templates/bootstrap-templates",
+    r"node_modules",
+    r"core/generator/gapic-generator-typescript/test-fixtures",
+]
+
+
+def walk_through_changed_owlbot_dirs(dir: Path) -> Tuple[List[str], List[str]]:
+    """
+    Walks through all API packages in google-cloud-node/packages once.
+
+    Returns:
+    The client libs with changes since the branch diverged from main, and all
+    the client libs, see walk_through_owlbot_dirs().
+    """
+    _fetch_main()
+    changed_files = _get_changed_files(dir)
+    all_dirs = []
+    changed_dirs = []
+    for sub_dir in PACKAGE_DIRECTORIES:
+        sub_dir_owlbot_dirs = find_owlbot_dirs_in_sub_dir(
+            dir, sub_dir, _PACKAGES_TO_EXCLUDE, search_for_changed_files=False
+        )
+        all_dirs.extend(sub_dir_owlbot_dirs)
+        changed_dirs.extend(
+            _select_changed_dirs(dir, sub_dir_owlbot_dirs, changed_files)
+        )
+    staged_dirs = _find_staged_dirs(dir)
+    # A package may be both changed and staged.
+    return (
+        list(dict.fromkeys(changed_dirs + staged_dirs)),
+        list(dict.fromkeys(all_dirs + staged_dirs)),
+    )
+
+
 def walk_through_owlbot_dirs(dir: Path, search_for_changed_files: bool):
     """
     Walks through all API packages in google-cloud-node/packages
@@ -478,40 +632,38 @@ def walk_through_owlbot_dirs(dir: Path, search_for_changed_files: bool):
     Returns:
     A list of client libs
     """
-    owlbot_dirs = []
-    packages_to_exclude = [
-        r"packages/gapic-node-processing/templates/bootstrap-templates",
-        r"node_modules",
-        r"core/generator/gapic-generator-typescript/test-fixtures",
-    ]
     if search_for_changed_files:
-        try:
-            # Need to run this step first in the post processor since we only clone
-            # the branch the PR is on in the Docker container
-            output = subprocess.run(
-                ["git", "fetch", "origin", "main:main", "--deepen=200"]
-            )
-            output.check_returncode()
-        except subprocess.CalledProcessError as e:
-            if e.returncode == 128:
-                logger.info(f"Error: ${e.output}; skipping fetching main")
-            else:
-                raise e
+        changed_dirs, _ = walk_through_changed_owlbot_dirs(dir)
+        return changed_dirs
+
+    owlbot_dirs = []
     for sub_dir in PACKAGE_DIRECTORIES:
         owlbot_dirs.extend(
             find_owlbot_dirs_in_sub_dir(
-                dir, sub_dir, packages_to_exclude, search_for_changed_files
+                dir, sub_dir, _PACKAGES_TO_EXCLUDE, search_for_changed_files=False
             )
         )
-    for path_object in dir.glob("owl-bot-staging/*"):
-        package_name = Path(path_object).name
-        destination_folder = get_destination_folder(package_name, dir)
-        if destination_folder is None:
-            raise RuntimeError(f"Can't find package {package_name} in subdirectories")
-        owlbot_dirs.append(
-            f"{Path(path_object).parents[1]}/{destination_folder}/{package_name}"
-        )
-    return owlbot_dirs
+    return owlbot_dirs + _find_staged_dirs(dir)
+
+
+_NEWPROCESS_SCRIPT = "/synthtool/synthtool/languages/node-monorepo-newprocess.js"
+
+# Libraries whose post-processing script is deferred to a single batch, while
+# owlbot_entrypoint runs, with the fingerprint to record once it succeeded.
+_batched_libraries: Optional[Dict[str, Optional[str]]] = None
+_batched_libraries_lock = threading.Lock()
+
+
+def run_newprocess(library_dirs: List[str], concurrency: int = 1) -> None:
+    """Runs the post-processing script of migrated libraries, in one node process.
+
+    Args:
+        library_dirs: absolute paths to the libraries.
+        concurrency: number of libraries the script processes at a time.
+    """
+    shell.run(
+        ["node", _NEWPROCESS_SCRIPT, f"--concurrency={concurrency}", *library_dirs]
+    )
 
 
 def owlbot_main(
@@ -544,6 +696,19 @@ def owlbot_main(
     Also, this function requires a default_version in your .repo-metadata.json.  Ex:
         "default_version": "v1",
     """
+    fingerprint = None
+    # The patch_staging callback can't be fingerprinted.
+    if _package_cache.ENABLED and patch_staging is _noop:
+        fingerprint = _get_fingerprint(
+            relative_dir, template_path, staging_excludes, templates_excludes
+        )
+        if _package_cache.is_unchanged(relative_dir, fingerprint):
+            logger.info(f"Skipping {relative_dir}, unchanged since its last run")
+            # The staging directory should never be merged into the main branch.
+            shutil.rmtree(
+                Path("owl-bot-staging", Path(relative_dir).name), ignore_errors=True
+            )
+            return
 
     # This is the "old" behavior that only applies to the handwritten libraries (that haven't yet been migrated to the new post-processing structure)
     if "handwritten" in relative_dir:
@@ -554,8 +719,8 @@ def owlbot_main(
 
         logging.basicConfig(level=logging.DEBUG)
         # Load the default version defined in .repo-metadata.json.
-        default_version = json.load(
-            open(Path(relative_dir, ".repo-metadata.json").resolve(), "rt")
+        default_version = _parsed_files.load_json(
+            Path(relative_dir, ".repo-metadata.json").resolve()
         ).get("default_version")
         is_esm = False
         src = Path(Path(relative_dir), "src").resolve()
@@ -608,27 +773,185 @@ def owlbot_main(
                 relative_dir=relative_dir, source_location=source_location
             )
             s_copy([templates], destination=relative_dir, excludes=templates_excludes)
+        _package_cache.record(relative_dir, fingerprint)
     # This is the "new" behavior that applies to libraries that have been migrated to the new post-processor (every gapic layer)
     else:
         staging = Path("owl-bot-staging", Path(relative_dir).name).resolve()
         s_copy = transforms.move
         if staging.is_dir():
-            print(f"Entering staging copying ${staging} to {relative_dir}")
+            logger.info(f"Entering staging copying ${staging} to {relative_dir}")
             # _tracked_paths.add(staging)
             s_copy([staging], destination=relative_dir)
             # The staging directory should never be merged into the main branch.
             shutil.rmtree(staging)
 
-        print(f"Entering post-processing for {relative_dir}")
-        shell.run(
-            [
-                "node",
-                "/synthtool/synthtool/languages/node-monorepo-newprocess.js",
-                Path(relative_dir).resolve(),
-            ]
+        with _batched_libraries_lock:
+            if _batched_libraries is not None:
+                # Post-processed with the other packages, see owlbot_entrypoint.
+                _batched_libraries[str(Path(relative_dir).resolve())] = fingerprint
+                return
+        logger.info(f"Entering post-processing for {relative_dir}")
+        run_newprocess([str(Path(relative_dir).resolve())])
+        _package_cache.record(relative_dir, fingerprint)
+        return
+
+
+def _get_fingerprint(
+    relative_dir,
+    template_path: Optional[Path],
+    staging_excludes: Optional[List[str]],
+    templates_excludes: Optional[List[str]],
+) -> str:
+    templates = None
+    if "handwritten" in relative_dir:
+        templates = template_path or gcp.common.get_default_template_root()
+    return _package_cache.fingerprint(
+        staging=Path("owl-bot-staging", Path(relative_dir).name),
+        templates=templates,
+        files=[Path(relative_dir, "owlbot.py")],
+        options=[
+            staging_excludes,
+            templates_excludes,
+            _step_cache.get_package_version(
+                f"{_TOOLS_DIRECTORY}/node_modules/gapic-node-processing"
+            ),
+        ],
+    )
+
+
+class _PackageLogHandler(logging.Handler):
+    """Writes the records logged by a thread whose output is redirected, see
+    shell.redirect_output(), to that output. Other records go to handlers."""
+
+    def __init__(self, handlers: List[logging.Handler]):
+        super().__init__()
+        self._handlers = handlers
+        self.setFormatter(
+            logging.Formatter("%(asctime)s %(name)s [%(levelname)s] > %(message)s")
         )
+
+    def emit(self, record: logging.LogRecord) -> None:
+        output = shell.get_redirected_output()
+        if output is not None:
+            output.write(self.format(record) + "\n")
+            return
+        for handler in self._handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def _process_owlbot_dir(
+    dir: str,
+    template_path: Optional[Path],
+    staging_excludes: Optional[List[str]],
+    templates_excludes: Optional[List[str]],
+    patch_staging: Callable[[Path], None],
+) -> None:
+    owlbot_py_file_path = hasOwlBotPy(dir)
+    if owlbot_py_file_path:
+        # owlbot.py may edit the package after its call to owlbot_main(), so
+        # the package is recorded here once the whole script has run, rather
+        # than by that owlbot_main().
+        fingerprint = None
+        if _package_cache.ENABLED:
+            fingerprint = _get_fingerprint(
+                dir, template_path, staging_excludes, templates_excludes
+            )
+            if _package_cache.is_unchanged(dir, fingerprint):
+                logger.info(f"Skipping {dir}, unchanged since its last run")
+                shutil.rmtree(
+                    Path("owl-bot-staging", Path(dir).name), ignore_errors=True
+                )
+                return
+        env = dict(os.environ)
+        env.pop("SYNTHTOOL_PACKAGE_CACHE", None)
+        shell.run(["python3", str(owlbot_py_file_path)], hide_output=False, env=env)
+        _package_cache.record(dir, fingerprint)
+    else:
+        owlbot_main(
+            dir,
+            template_path,
+            staging_excludes,
+            templates_excludes,
+            patch_staging,
+        )
+
+
+class _PackageError(Exception):
+    """Carries the output of a package that failed."""
+
+
+def _process_owlbot_dirs(
+    owlbot_dirs: List[str],
+    jobs: int,
+    keep_going: bool,
+    *args: Any,
+) -> None:
+    """Post-processes the packages, up to jobs at a time.
+
+    With several jobs, the output of each package is printed once it is done.
+    Unless keep_going, the first failure cancels the packages that haven't
+    started and is raised once the running ones are done. Otherwise, every
+    package is processed and the failures are reported together.
+    """
+    if jobs <= 1:
+        for dir in owlbot_dirs:
+            _process_owlbot_dir(dir, *args)
         return
 
+    def process(dir: str) -> str:
+        output = io.StringIO()
+        try:
+            with shell.redirect_output(output):
+                _process_owlbot_dir(dir, *args)
+        except Exception as e:
+            raise _PackageError(output.getvalue()) from e
+        return output.getvalue()
+
+    start = time.monotonic()
+    failures: Dict[str, BaseException] = {}
+    skipped = 0
+    handlers, propagate = logger.handlers, logger.propagate
+    logger.handlers = [_PackageLogHandler(handlers)]
+    logger.propagate = False
+    try:
+        with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+            futures = {executor.submit(process, dir): dir for dir in owlbot_dirs}
+            for future in concurrent.futures.as_completed(futures):
+                dir = futures[future]
+                if future.cancelled():
+                    skipped += 1
+                    continue
+                error = future.exception()
+                logger.info(f"Post-processed {dir}")
+                if error is None:
+                    sys.stdout.write(future.result())
+                    sys.stdout.flush()
+                    continue
+                sys.stdout.write(str(error))
+                sys.stdout.flush()
+                failures[dir] = error.__cause__ or error
+                logger.error(f"Post-processing {dir} failed: {failures[dir]!r}")
+                if not keep_going:
+                    for pending in futures:
+                        pending.cancel()
+    finally:
+        logger.handlers = handlers
+        logger.propagate = propagate
+
+    logger.info(
+        f"Post-processed {len(owlbot_dirs) - len(failures) - skipped} of "
+        f"{len(owlbot_dirs)} packages in {time.monotonic() - start:.1f}s, "
+        f"{len(failures)} failed, {skipped} skipped"
+    )
+    if failures and not keep_going:
+        raise next(iter(failures.values()))
+    if failures:
+        raise RuntimeError(
+            f"Post-processing failed for {len(failures)} packages: "
+            f"{', '.join(failures)}"
+        )
+
 
 def owlbot_entrypoint(
     specified_owlbot_dirs: Optional[List[str]] = None,
@@ -636,40 +959,57 @@ def owlbot_entrypoint(
     staging_excludes: Optional[List[str]] = None,
     templates_excludes: Optional[List[str]] = None,
     patch_staging: Callable[[Path], None] = _noop,
+    jobs: int = 1,
+    keep_going: bool = False,
 ):
+    """Post-processes the specified packages, or the ones with changes.
+
+    Args:
+        jobs: number of packages post-processed concurrently.
+        keep_going: keep processing the other packages when one fails, and
+            report the failures at the end. Only applies to several jobs.
+    """
+    global _batched_libraries
+
+    all_owlbot_dirs = None
     if specified_owlbot_dirs:
-        for dir in specified_owlbot_dirs:
-            owlbot_py_file_path = hasOwlBotPy(dir)
-            if owlbot_py_file_path:
-                subprocess.run(["python3", str(owlbot_py_file_path)], check=True)
-            else:
-                owlbot_main(
-                    dir,
-                    template_path,
-                    staging_excludes,
-                    templates_excludes,
-                    patch_staging,
-                )
+        owlbot_dirs = specified_owlbot_dirs
     else:
-        owlbot_dirs = walk_through_owlbot_dirs(
-            Path.cwd(), search_for_changed_files=True
+        # The same walk finds the packages for release-please below.
+        owlbot_dirs, all_owlbot_dirs = walk_through_changed_owlbot_dirs(Path.cwd())
+    # A package processed twice would be by two threads at once.
+    owlbot_dirs = list(dict.fromkeys(owlbot_dirs))
+
+    # Migrated libraries are post-processed together, by a single node process.
+    with _batched_libraries_lock:
+        _batched_libraries = {}
+    try:
+        _process_owlbot_dirs(
+            owlbot_dirs,
+            jobs,
+            keep_going,
+            template_path,
+            staging_excludes,
+            templates_excludes,
+            patch_staging,
         )
-        for dir in owlbot_dirs:
-            owlbot_py_file_path = hasOwlBotPy(dir)
-            if owlbot_py_file_path:
-                subprocess.run(["python3", str(owlbot_py_file_path)], check=True)
-            else:
-                owlbot_main(
-                    dir,
-                    template_path,
-                    staging_excludes,
-                    templates_excludes,
-                    patch_staging,
-                )
+    finally:
+        with _batched_libraries_lock:
+            library_dirs, _batched_libraries = _batched_libraries, None
+        # Also when another package failed: the libraries copied in so far
+        # no longer have a staging directory to post-process them from.
+        if library_dirs:
+            logger.info(f"Entering post-processing for {len(library_dirs)} libraries")
+            run_newprocess(sorted(library_dirs), concurrency=jobs)
+            for library_dir, fingerprint in library_dirs.items():
+                _package_cache.record(library_dir, fingerprint)
+
     if Path("release-please-config.json").is_file():
-        write_release_please_config(
-            walk_through_owlbot_dirs(Path.cwd(), search_for_changed_files=False)
-        )
+        if all_owlbot_dirs is None:
+            all_owlbot_dirs = walk_through_owlbot_dirs(
+                Path.cwd(), search_for_changed_files=False
+            )
+        write_release_please_config(all_owlbot_dirs)
 
 
 def hasOwlBotPy(dir):
@@ -682,8 +1022,30 @@ if __name__ == "__main__":
     # if you want to specify package names you wish to run in command line, i.e.,
     # python -m synthtool.languages.node_mono_repo packages/google-cloud-compute,packages/google-cloud-asset
     # if nothing is specified, it will default to only search for changed files
-    if len(sys.argv) > 1:
-        specified_owlbot_dirs = (sys.argv[1]).split(",")
-        owlbot_entrypoint(specified_owlbot_dirs=specified_owlbot_dirs)
-    else:
-        owlbot_entrypoint()
+    parser = argparse.ArgumentParser(
+        description="Post-processes the packages of a node mono-repo."
+    )
+    parser.add_argument(
+        "owlbot_dirs",
+        nargs="?",
+        help="Comma separated package directories. Defaults to the packages "
+        "with changes.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of packages to post-process concurrently.",
+    )
+    parser.add_argument(
+        "--keep-going",
+        action="store_true",
+        help="Keep post-processing the other packages when one fails.",
+    )
+    args = parser.parse_args()
+
+    owlbot_entrypoint(
+        specified_owlbot_dirs=args.owlbot_dirs.split(",") if args.owlbot_dirs else None,
+        jobs=args.jobs,
+        keep_going=args.keep_going,
+    )
@@ -23,6 +23,7 @@ import subprocess
 import typing
 
 import synthtool as s
+from synthtool import _package_cache
 from synthtool.log import logger
 
 
@@ -167,6 +168,15 @@ def owlbot_main(
     patch_func: typing.Callable[[], None] = owlbot_patch,
 ) -> None:
     """Copies files from generated tree."""
+    fingerprint = None
+    # A custom patch_func can't be fingerprinted.
+    if _package_cache.ENABLED and patch_func is owlbot_patch:
+        fingerprint = _package_cache.fingerprint(
+            staging=src, files=[dest / OWLBOT_PY_FILENAME], options=copy_excludes
+        )
+        if _package_cache.is_unchanged(dest, fingerprint):
+            logger.info(f"Skipping {dest}, unchanged since its last run")
+            return
     entries = os.scandir(src)
     if not entries:
         logger.info("there is no version subdirectory to copy")
@@ -177,6 +187,7 @@ def owlbot_main(
             owlbot_copy_version(version_src, dest, copy_excludes)
     with pushd(dest):
         patch_func()
+    _package_cache.record(dest, fingerprint)
 
 
 def owlbot_entrypoint(staging_dir: str = STAGING_DIR) -> None:
@@ -12,28 +12,45 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import sys
 
-import json
 from pathlib import Path
 import shutil
 from typing import Any, Dict, List, Optional
 import yaml
 
 import synthtool as s
-from synthtool import _tracked_paths, log, shell
+from synthtool import _parsed_files, _tracked_paths, _written_files, log, shell
 from synthtool.gcp.common import CommonTemplates, detect_versions
+from synthtool.languages import _python_formatter, common
 from synthtool.sources import templates
 
 PathOrStr = templates.PathOrStr
 
 IGNORED_VERSIONS: List[str] = []
 
-SAMPLES_TEMPLATE_PATH = Path(CommonTemplates()._template_root) / "python_samples"
+# SAMPLES_TEMPLATE_PATH and NOTEBOOK_TEMPLATE_PATH are resolved on first use,
+# see __getattr__, as resolving the templates may clone them.
+_TEMPLATE_DIRECTORIES = {
+    "SAMPLES_TEMPLATE_PATH": "python_samples",
+    "NOTEBOOK_TEMPLATE_PATH": "python_notebooks_testing_pipeline",
+}
 
-NOTEBOOK_TEMPLATE_PATH = (
-    Path(CommonTemplates()._template_root) / "python_notebooks_testing_pipeline"
-)
+
+@functools.lru_cache(maxsize=None)
+def _get_template_root() -> Path:
+    return Path(CommonTemplates()._template_root)
+
+
+def _get_template_path(name: str) -> Path:
+    return _get_template_root() / _TEMPLATE_DIRECTORIES[name]
+
+
+def __getattr__(name: str) -> Any:
+    if name in _TEMPLATE_DIRECTORIES:
+        return _get_template_path(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def _get_help(filename: str) -> str:
@@ -65,8 +82,9 @@ def python_notebooks_testing_pipeline() -> None:
     in_client_library = Path("owlbot.py").exists()
     if in_client_library:
         excludes: List[str] = []
-        _tracked_paths.add(NOTEBOOK_TEMPLATE_PATH)
-        s.copy([NOTEBOOK_TEMPLATE_PATH], excludes=excludes)
+        notebook_template_path = _get_template_path("NOTEBOOK_TEMPLATE_PATH")
+        _tracked_paths.add(notebook_template_path)
+        s.copy([notebook_template_path], excludes=excludes)
 
 
 def py_samples(
@@ -103,7 +121,9 @@ def py_samples(
     skip_readmes = True
     if skip_readmes:
         excludes.append("README.rst")
-    t = templates.TemplateGroup(SAMPLES_TEMPLATE_PATH, excludes=excludes)
+    t = templates.TemplateGroup(
+        _get_template_path("SAMPLES_TEMPLATE_PATH"), excludes=excludes
+    )
 
     t.env.globals["get_help"] = _get_help  # for sample readmegen
 
@@ -154,7 +174,7 @@ def owlbot_main() -> None:
 
     try:
         # Load the default version defined in .repo-metadata.json.
-        default_version = json.load(open(".repo-metadata.json", "rt")).get(
+        default_version = _parsed_files.load_json(".repo-metadata.json").get(
             "default_version"
         )
     except FileNotFoundError:
@@ -178,9 +198,14 @@ def owlbot_main() -> None:
 
         py_samples(skip_readmes=True)
 
-        # run format nox session for all directories which have a noxfile
-        for noxfile in Path(".").glob("**/noxfile.py"):
-            s.shell.run(["nox", "-s", "format"], cwd=noxfile.parent, hide_output=False)
+        # run the format session of all directories which have a noxfile
+        noxfile_dirs = common.find_dirs(".", marker="noxfile.py")
+        if Path("noxfile.py").is_file():
+            noxfile_dirs.insert(0, ".")
+        only = None
+        if _written_files.FORMAT_WRITTEN_ONLY:
+            only = _written_files.get()
+        _python_formatter.format_dirs(noxfile_dirs, only=only)
 
 
 if __name__ == "__main__":
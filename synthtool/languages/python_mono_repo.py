@@ -12,13 +12,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
+import argparse
+import concurrent.futures
+import contextlib
 import os
-from pathlib import Path
+from pathlib import Path, PurePosixPath
 import re
 import shutil
+import sys
+import tempfile
+import traceback
+from typing import IO, Iterator, List, Optional, Set, Tuple
 import synthtool
 import synthtool.gcp as gcp
+from synthtool import _package_cache, _parsed_files, _tracked_paths, _written_files
+from synthtool import metadata
+from synthtool.languages import _python_formatter, common
+from synthtool.log import logger
 import yaml
 
 PB2_HEADER = r"""(\# -\*- coding: utf-8 -\*-\n)(\# Generated by the protocol buffer compiler\.  DO NOT EDIT!.*?# source: .*?\.proto)"""
@@ -162,16 +172,45 @@ def apply_client_specific_post_processing(
                     ), f"Replaced {replacement_count} rather than {expected_count} instances"
 
 
-def walk_through_owlbot_dirs(dir: Path):
+def _get_changed_dirs(dir: Path, base_ref: str) -> Set[str]:
+    """Returns the directories, relative to dir, containing files changed
+    since the branch diverged from base_ref."""
+    changed_dirs: Set[str] = set()
+    for changed_file in common.get_changed_files(dir, base_ref):
+        changed_dirs.update(
+            parent.as_posix() for parent in PurePosixPath(changed_file).parents
+        )
+    return changed_dirs
+
+
+def walk_through_owlbot_dirs(dir: Path, changed_since: Optional[str] = None):
     """
     Walks through all API packages in google-cloud-python/packages
+
+    Args:
+        dir: the root of the mono-repo.
+        changed_since: if set, only return the packages with a staging directory
+            in owl-bot-staging, or with files changed since the branch diverged
+            from this git ref.
     Returns:
     A list of client libs
     """
+    changed_dirs = None
+    if changed_since is not None:
+        changed_dirs = _get_changed_dirs(dir, changed_since)
+
     owlbot_dirs = []
-    for path_object in dir.glob("packages/**/.OwlBot.yaml"):
-        if path_object.is_file():
-            owlbot_dirs.append(str(Path(path_object).parents[0]))
+    # Packages aren't nested, so the walk doesn't descend into them.
+    for package_path in common.find_dirs(
+        dir / "packages", marker=".OwlBot.yaml", stop_at_match=True
+    ):
+        package_dir = Path(package_path)
+        if changed_dirs is not None and not (
+            (dir / "owl-bot-staging" / package_dir.name).is_dir()
+            or package_dir.relative_to(dir).as_posix() in changed_dirs
+        ):
+            continue
+        owlbot_dirs.append(str(package_dir))
 
     return owlbot_dirs
 
@@ -195,13 +234,34 @@ def owlbot_main(package_dir: str) -> None:
         package_dir: relative path to the directory for a specific package. For example
             packages/google-cloud-video-transcoder
     """
+    fingerprint = None
+    if _package_cache.ENABLED:
+        fingerprint = _get_fingerprint(package_dir)
+        if _package_cache.is_unchanged(package_dir, fingerprint):
+            logger.info(f"Skipping {package_dir}, unchanged since its last run")
+            return
+    _owlbot_main(package_dir)
+    _package_cache.record(package_dir, fingerprint)
+
 
+def _get_fingerprint(package_dir: str) -> str:
+    package_name = Path(package_dir).name
+    post_processing_dir = Path(package_dir, "scripts", "client-post-processing")
+    return _package_cache.fingerprint(
+        staging=f"owl-bot-staging/{package_name}",
+        templates=gcp.common.get_default_template_root() / "python_mono_repo_library",
+        files=[Path(package_dir, "owlbot.py"), *post_processing_dir.glob("*.yaml")],
+        options=_python_formatter.get_format_tool_version(),
+    )
+
+
+def _owlbot_main(package_dir: str) -> None:
     clean_up_generated_samples = True
 
     try:
         # Load the default version defined in .repo-metadata.json.
-        default_version = json.load(
-            open(f"{Path(package_dir)}/.repo-metadata.json", "rt")
+        default_version = _parsed_files.load_json(
+            f"{Path(package_dir)}/.repo-metadata.json"
         ).get("default_version")
     except FileNotFoundError:
         raise Exception("Could not find the default version")
@@ -256,22 +316,116 @@ def owlbot_main(package_dir: str) -> None:
         # add license header to pb2.py and pb2.pyi files.
         fix_pb2_headers(package_dir)
 
-        # run format nox session for all directories which have a noxfile
-        for noxfile in Path(".").glob(f"packages/{package_name}/**/noxfile.py"):
-            synthtool.shell.run(
-                ["nox", "-s", "format", "--no-venv", "--no-install"],
-                cwd=noxfile.parent,
-                hide_output=False,
-            )
+        # run the format session of all directories which have a noxfile
+        package_path = f"packages/{package_name}"
+        noxfile_dirs = common.find_dirs(package_path, marker="noxfile.py")
+        if Path(package_path, "noxfile.py").is_file():
+            noxfile_dirs.insert(0, package_path)
+        only = None
+        if _written_files.FORMAT_WRITTEN_ONLY:
+            only = _written_files.get(package_path)
+        _python_formatter.format_dirs(noxfile_dirs, no_venv=True, only=only)
 
         apply_client_specific_post_processing(
             f"packages/{package_name}/scripts/client-post-processing", package_name
         )
 
 
+@contextlib.contextmanager
+def _redirect_output(output: IO[str]) -> Iterator[None]:
+    """Redirects stdout and stderr, including those of subprocesses, to a file."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = [os.dup(1), os.dup(2)]
+    os.dup2(output.fileno(), 1)
+    os.dup2(output.fileno(), 2)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for fd, saved_fd in zip((1, 2), saved_fds):
+            os.dup2(saved_fd, fd)
+            os.close(saved_fd)
+
+
+def _owlbot_main_worker(package_dir: str) -> Tuple[str, Optional[str]]:
+    """Runs owlbot_main for a package in a worker process.
+
+    Returns:
+        The output of the package and, if it failed, the formatted exception.
+    """
+    # Worker processes are reused, start each package from a clean state.
+    _tracked_paths.reset()
+    _written_files.reset()
+    metadata.reset()
+    error = None
+    with tempfile.TemporaryFile(mode="w+") as output:
+        with _redirect_output(output):
+            try:
+                owlbot_main(package_dir)
+            except Exception:
+                error = traceback.format_exc()
+        output.seek(0)
+        return output.read(), error
+
+
+def owlbot_main_all(package_dirs: List[str], jobs: int = 1) -> None:
+    """Runs owlbot_main for every package.
+
+    Args:
+        package_dirs: relative paths to the directories of the packages.
+        jobs: number of packages processed concurrently, in separate processes.
+            The output of each package is printed once it is done, in the order
+            of package_dirs. A failing package doesn't stop the others, the
+            failures are reported together at the end.
+    """
+    if jobs <= 1:
+        for package_dir in package_dirs:
+            owlbot_main(package_dir)
+        return
+
+    failures = []
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        futures = [
+            executor.submit(_owlbot_main_worker, package_dir)
+            for package_dir in package_dirs
+        ]
+        for package_dir, future in zip(package_dirs, futures):
+            output, error = future.result()
+            logger.info(f"Post-processed {package_dir}")
+            sys.stdout.write(output)
+            if error is not None:
+                logger.error(f"Post-processing {package_dir} failed:\n{error}")
+                failures.append(package_dir)
+            sys.stdout.flush()
+
+    if failures:
+        raise RuntimeError(
+            f"Post-processing failed for {len(failures)} of {len(package_dirs)} "
+            f"packages: {', '.join(failures)}"
+        )
+
+
 if __name__ == "__main__":
-    owlbot_dirs = walk_through_owlbot_dirs(Path.cwd())
-    for package_dir in owlbot_dirs:
-        owlbot_main(package_dir)
+    parser = argparse.ArgumentParser(
+        description="Post-processes the packages of a python mono-repo."
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of packages to post-process concurrently.",
+    )
+    parser.add_argument(
+        "--changed-since",
+        metavar="REF",
+        help="Only post-process the packages with staged files, or with files "
+        "changed since the branch diverged from this git ref.",
+    )
+    args = parser.parse_args()
+
+    owlbot_dirs = walk_through_owlbot_dirs(Path.cwd(), args.changed_since)
+    owlbot_main_all(owlbot_dirs, jobs=args.jobs)
 
     synthtool.remove_staging_dirs()
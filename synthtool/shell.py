@@ -12,28 +12,55 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
 import subprocess
+import threading
+from typing import IO, Iterator, Optional
 
 from synthtool.log import logger
 
+_redirected = threading.local()
 
-def run(args, *, cwd=None, check=True, hide_output=True):
-    if hide_output:
+
+@contextlib.contextmanager
+def redirect_output(output: IO[str]) -> Iterator[None]:
+    """Writes the output of the commands run by this thread with
+    hide_output=False to output, instead of letting them print it."""
+    previous = get_redirected_output()
+    _redirected.output = output
+    try:
+        yield
+    finally:
+        _redirected.output = previous
+
+
+def get_redirected_output() -> Optional[IO[str]]:
+    """Returns where this thread's output is redirected to, if anywhere."""
+    return getattr(_redirected, "output", None)
+
+
+def run(args, *, cwd=None, check=True, hide_output=True, env=None):
+    output = None if hide_output else get_redirected_output()
+    if hide_output or output is not None:
         stdout = subprocess.PIPE
     else:
         stdout = None
 
     try:
-        return subprocess.run(
+        result = subprocess.run(
             args,
             stdout=stdout,
             stderr=subprocess.STDOUT,
             cwd=cwd,
             check=check,
             encoding="utf-8",
+            env=env,
         )
     except subprocess.CalledProcessError as exc:
         logger.error(
             f"Failed executing {' '.join((str(arg) for arg in args))}:\n\n{exc.stdout}"
         )
         raise exc
+    if output is not None:
+        output.write(result.stdout)
+    return result
@@ -12,12 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import concurrent.futures
 import os
 import pathlib
 import re
 import shutil
 import subprocess
-from typing import Dict, Optional, Tuple, Union
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
 
 import synthtool
 import synthtool.preconfig
@@ -30,6 +34,36 @@ REPO_REGEX = (
 
 USE_SSH = os.environ.get("AUTOSYNTH_USE_SSH", False)
 
+PREFETCH_WORKERS = 4
+
+CACHE_NAMESPACE = "git"
+
+# Number of seconds a fetched mirror is considered fresh by later processes.
+# The default of 0 fetches once per process.
+FETCH_TTL = float(os.environ.get("SYNTHTOOL_GIT_CACHE_TTL", 0))
+
+# Number of worktrees kept per repo, the least recently used ones being removed
+# beyond it. 0 keeps them all.
+MAX_WORKTREES = int(os.environ.get("SYNTHTOOL_GIT_CACHE_WORKTREES", 8))
+
+# Written into a mirror after each fetch. Its mtime is the time of the fetch
+# and its content the SHA the default branch pointed to.
+_FETCH_STAMP = "synthtool-fetched"
+
+# Written next to a worktree, holds the output of get_latest_commit().
+_COMMIT_STAMP = "synthtool-commit"
+
+_SHA_REGEX = re.compile(r"^[0-9a-f]{40}$")
+
+# Mirrors that were already fetched by this process.
+_fetched_mirrors: Set[pathlib.Path] = set()
+_fetched_mirrors_lock = threading.Lock()
+
+# Results of clone() in this process, keyed by (url, dest, committish).
+_clone_results: Dict[
+    Tuple[str, Optional[pathlib.Path], Optional[str]], Tuple[pathlib.Path, str, str]
+] = {}
+
 
 def make_repo_clone_url(repo: str) -> str:
     """Returns a fully-qualified repo URL on GitHub from a string containing
@@ -44,31 +78,268 @@ def make_repo_clone_url(repo: str) -> str:
         return f"https://github.com/{repo}.git"
 
 
-def _local_default_branch(path: pathlib.Path) -> Union[str, None]:
-    """Helper method to infer the default branch.
+def _get_cache_paths(
+    dest: pathlib.Path, url: str
+) -> Tuple[pathlib.Path, pathlib.Path, pathlib.Path]:
+    """Returns the cache entry of a repo, its mirror and its worktrees dir."""
+    entry = dest / pathlib.Path(url).stem
+    return entry, entry / "mirror.git", entry / "worktrees"
 
-    Sorts the list of branches by committerdate (latest is last) and then
-    returns the later of master or main. The order of branches that are tied
-    by committerdate is undefined.
 
-    Arguments:
-        path {pathlib.Path} - Path to the local git clone
+def _update_mirror(url: str, mirror: pathlib.Path) -> None:
+    """Creates or refreshes the bare mirror of a remote repo.
 
-    Returns:
-        string -- The inferred default branch.
+    The mirror tracks every branch and tag of the remote, so that any
+    committish can be resolved locally without touching the network again.
+
+    Arguments:
+        url {str} -- Url pointing to remote git repo.
+        mirror {pathlib.Path} -- Local path of the bare mirror.
     """
-    branches = (
-        subprocess.check_output(
-            ["git", "branch", "--sort=-committerdate", "--format=%(refname:short)"],
-            cwd=str(path),
+    if not mirror.exists():
+        shell.run(["git", "clone", "--bare", url, str(mirror)], check=True)
+        shell.run(
+            [
+                "git",
+                "config",
+                "remote.origin.fetch",
+                "+refs/heads/*:refs/heads/*",
+            ],
+            cwd=str(mirror),
+            check=True,
+        )
+    else:
+        shell.run(
+            ["git", "fetch", "--prune", "--tags", "origin"],
+            cwd=str(mirror),
+            check=True,
         )
-        .decode("utf-8")
-        .splitlines()
+
+
+def _write_stamp(path: pathlib.Path, text: str) -> None:
+    """Atomically writes a stamp file, so that an interrupted write doesn't
+    leave it truncated."""
+    fd, temp_path = tempfile.mkstemp(prefix=f".{path.name}-", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def _is_fresh(mirror: pathlib.Path) -> bool:
+    """Whether the mirror was fetched less than FETCH_TTL seconds ago."""
+    if FETCH_TTL <= 0:
+        return False
+    try:
+        fetched_at = (mirror / _FETCH_STAMP).stat().st_mtime
+    except FileNotFoundError:
+        return False
+    return time.time() - fetched_at < FETCH_TTL
+
+
+def _fetch_mirror(url: str, mirror: pathlib.Path, update: bool = False) -> None:
+    """Updates the mirror unless it was fetched by this process or is fresh."""
+    with _fetched_mirrors_lock:
+        if mirror in _fetched_mirrors and not update:
+            return
+
+    if _is_fresh(mirror) and not update:
+        logger.debug(f"Reusing {mirror} fetched less than {FETCH_TTL}s ago")
+    else:
+        _update_mirror(url, mirror)
+        head = _rev_parse(mirror, "HEAD")
+        _write_stamp(mirror / _FETCH_STAMP, head)
+
+    with _fetched_mirrors_lock:
+        _fetched_mirrors.add(mirror)
+
+
+def _rev_parse(repo: pathlib.Path, committish: str) -> str:
+    output = subprocess.check_output(
+        ["git", "rev-parse", "--verify", f"{committish}^{{commit}}"],
+        cwd=str(repo),
+    )
+    return output.decode("utf-8").strip()
+
+
+def _resolve_committish(
+    mirror: pathlib.Path, worktrees: pathlib.Path, committish: Optional[str]
+) -> str:
+    """Resolves a committish (or the default branch) to a full commit SHA.
+
+    The default branch recorded at fetch time and SHAs that are already
+    checked out are resolved without running git.
+    """
+    if committish is None:
+        return (mirror / _FETCH_STAMP).read_text().strip()
+    if _SHA_REGEX.match(committish) and (worktrees / committish).is_dir():
+        return committish
+    return _rev_parse(mirror, committish)
+
+
+def _find_checkout(
+    mirror: pathlib.Path,
+    worktrees: pathlib.Path,
+    name: str,
+    committish: Optional[str],
+) -> Optional[Tuple[pathlib.Path, str, str]]:
+    """Returns an existing checkout that needs no update, or None.
+
+    Only reads the cache, so it's safe to call under a shared lock.
+    """
+    with _fetched_mirrors_lock:
+        fetched = mirror in _fetched_mirrors
+    if not (fetched or _is_fresh(mirror)):
+        return None
+
+    try:
+        sha = _resolve_committish(mirror, worktrees, committish)
+        worktree = worktrees / sha / name
+        commit = (worktrees / sha / _COMMIT_STAMP).read_text()
+        sha, message = commit.split("\n", 1)
+    except (FileNotFoundError, ValueError, subprocess.CalledProcessError):
+        # A corrupt stamp is written again under the exclusive lock.
+        return None
+
+    if not (worktree / ".git").exists():
+        return None
+    return worktree, sha, message
+
+
+def _get_worktree_commit(worktree: pathlib.Path) -> Tuple[str, str]:
+    """get_latest_commit() for an immutable worktree, remembered on disk."""
+    stamp = worktree.parent / _COMMIT_STAMP
+    try:
+        sha, message = stamp.read_text().split("\n", 1)
+        return sha, message
+    except (FileNotFoundError, ValueError):
+        pass
+    sha, message = get_latest_commit(worktree)
+    _write_stamp(stamp, f"{sha}\n{message}")
+    return sha, message
+
+
+def _add_worktree(mirror: pathlib.Path, worktree: pathlib.Path, sha: str) -> None:
+    """Checks out a detached worktree of the mirror at the given SHA.
+
+    Worktrees are keyed by SHA and never modified once created, so an existing
+    one is reused as is.
+    """
+    if (worktree / ".git").exists():
+        return
+
+    if worktree.exists():
+        # Left behind by an interrupted checkout.
+        shutil.rmtree(worktree)
+    shell.run(["git", "worktree", "prune"], cwd=str(mirror), check=True)
+
+    worktree.parent.mkdir(parents=True, exist_ok=True)
+    shell.run(
+        ["git", "worktree", "add", "--detach", str(worktree), sha],
+        cwd=str(mirror),
+        check=True,
     )
-    for branch in branches:
-        if branch == "master" or branch == "main":
-            return branch
-    return None
+    if (worktree / ".gitmodules").exists():
+        shell.run(
+            ["git", "submodule", "update", "--init", "--recursive"],
+            cwd=str(worktree),
+            check=True,
+        )
+
+
+def _prune_worktrees(
+    mirror: pathlib.Path, worktrees: pathlib.Path, keep: pathlib.Path
+) -> None:
+    """Removes the least recently used worktrees beyond MAX_WORKTREES.
+
+    Must be called under the exclusive lock of the cache entry. The worktree
+    being checked out, the ones returned earlier in this process, and the
+    ones used by any process during the cache.EVICTION_GRACE_PERIOD are kept.
+    """
+    if MAX_WORKTREES <= 0:
+        return
+    in_use = {path.parent for path, _, _ in list(_clone_results.values())}
+    used_at = {
+        path: path.stat().st_mtime for path in worktrees.iterdir() if path.is_dir()
+    }
+    paths = sorted(used_at, key=used_at.__getitem__, reverse=True)
+    now = time.time()
+    stale = [
+        path
+        for path in paths[MAX_WORKTREES:]
+        if path != keep.parent
+        and path not in in_use
+        and now - used_at[path] >= cache.EVICTION_GRACE_PERIOD
+    ]
+    if not stale:
+        return
+    for path in stale:
+        logger.debug(f"Removing the unused worktree {path}")
+        shutil.rmtree(path)
+    shell.run(["git", "worktree", "prune"], cwd=str(mirror), check=True)
+
+
+def _clone(
+    url: str,
+    dest: Optional[pathlib.Path],
+    committish: Optional[str],
+    force: bool,
+) -> Tuple[pathlib.Path, str, str]:
+    """Does the work of clone(), returning the local path, sha and message."""
+    preclone = get_preclone(url)
+
+    if preclone:
+        logger.debug(f"Using precloned repo {preclone}")
+        dest = pathlib.Path(preclone)
+
+        if committish and _rev_parse(dest, "HEAD") != _rev_parse(dest, committish):
+            shell.run(["git", "reset", "--hard", committish], cwd=str(dest))
+        sha, message = get_latest_commit(dest)
+    else:
+        if dest is None:
+            dest = cache.get_namespace_dir(CACHE_NAMESPACE)
+
+        name = pathlib.Path(url).stem
+        entry, mirror, worktrees = _get_cache_paths(dest, url)
+
+        # Other synth processes may share the cache: look for an existing
+        # checkout under a shared lock, and only update under an exclusive one.
+        if not force:
+            with cache.lock(entry, shared=True):
+                checkout = _find_checkout(mirror, worktrees, name, committish)
+                if checkout:
+                    cache.touch(checkout[0].parent)
+                cache.touch(entry)
+            if checkout:
+                return checkout
+
+        with cache.lock(entry):
+            if force:
+                if entry.exists():
+                    shutil.rmtree(entry)
+                with _fetched_mirrors_lock:
+                    _fetched_mirrors.discard(mirror)
+
+            _fetch_mirror(url, mirror)
+            try:
+                sha = _resolve_committish(mirror, worktrees, committish)
+            except subprocess.CalledProcessError:
+                if not _is_fresh(mirror):
+                    raise
+                # The committish may be newer than the fetch that was reused.
+                _fetch_mirror(url, mirror, update=True)
+                sha = _resolve_committish(mirror, worktrees, committish)
+            dest = worktrees / sha / name
+            _add_worktree(mirror, dest, sha)
+            sha, message = _get_worktree_commit(dest)
+            cache.touch(dest.parent)
+            _prune_worktrees(mirror, worktrees, dest)
+            cache.touch(entry)
+
+    return dest, sha, message
 
 
 def clone(
@@ -83,6 +354,13 @@ def clone(
       1. It's in the cache (the default destitination).
       2. It was supplied via the preconfig file.
 
+    Cached repos are stored as a single bare mirror per remote
+    (``{dest}/{name}/mirror.git``) plus one read-only worktree per commit
+    (``{dest}/{name}/worktrees/{sha}/{name}``). Switching to a commit that was
+    already checked out costs nothing, and several synth runs can use different
+    revisions of the same repo at the same time. By default, ``dest`` is the
+    ``git`` namespace of the synthtool cache, where each repo is one entry.
+
     Arguments:
         url {str} -- Url pointing to remote git repo.
 
@@ -94,38 +372,19 @@ def clone(
     Returns:
         pathlib.Path -- Local directory where the repo was cloned.
     """
-    preclone = get_preclone(url)
-
-    if preclone:
-        logger.debug(f"Using precloned repo {preclone}")
-        dest = pathlib.Path(preclone)
+    key = (url, dest, committish)
+    # Another process may have pruned a worktree returned earlier.
+    if not force and key in _clone_results and _clone_results[key][0].exists():
+        dest, sha, message = _clone_results[key]
+        logger.debug(f"Reusing {dest} cloned earlier in this process")
     else:
-        if dest is None:
-            dest = cache.get_cache_dir()
-
-        dest = dest / pathlib.Path(url).stem
-
-        if force and dest.exists():
-            shutil.rmtree(dest)
-
-        default_branch = None
-        if not dest.exists():
-            cmd = ["git", "clone", "--recurse-submodules", "--single-branch", url, dest]
-            shell.run(cmd, check=True)
-        else:
-            default_branch = _local_default_branch(dest)
-            shell.run(["git", "checkout", default_branch], cwd=str(dest), check=True)
-            shell.run(["git", "pull"], cwd=str(dest), check=True)
-        committish = committish or default_branch
-
-    if committish:
-        shell.run(["git", "reset", "--hard", committish], cwd=str(dest))
+        dest, sha, message = _clone(url, dest, committish, force)
+        _clone_results[key] = (dest, sha, message)
 
     # track all git repositories
     _tracked_paths.add(dest)
 
     # add repo to metadata
-    sha, message = get_latest_commit(dest)
     commit_metadata = extract_commit_message_metadata(message)
 
     metadata.add_git_source(
@@ -139,6 +398,53 @@ def clone(
     return dest
 
 
+def _prefetch_mirror(url: str, entry: pathlib.Path, mirror: pathlib.Path) -> None:
+    with cache.lock(entry):
+        _fetch_mirror(url, mirror)
+        cache.touch(entry)
+
+
+def prefetch(
+    urls: Iterable[str],
+    dest: Optional[pathlib.Path] = None,
+    max_workers: int = PREFETCH_WORKERS,
+) -> None:
+    """Fetches several remote git repos concurrently.
+
+    Only the network part of clone() is done here; a later clone() of the same
+    url in this process reuses the fetched mirror and returns immediately.
+    Repos supplied via the preconfig file are skipped. Failures are logged and
+    left for clone() to report.
+
+    Arguments:
+        urls {Iterable[str]} -- Urls pointing to remote git repos.
+
+    Keyword Arguments:
+        dest {pathlib.Path} -- Local folder where repos should be cloned. (default: {None})
+        max_workers {int} -- Maximum number of concurrent fetches. (default: {PREFETCH_WORKERS})
+    """
+    if dest is None:
+        dest = cache.get_namespace_dir(CACHE_NAMESPACE)
+
+    mirrors = {
+        url: _get_cache_paths(dest, url) for url in urls if not get_preclone(url)
+    }
+    if not mirrors:
+        return
+
+    logger.debug(f"Prefetching {', '.join(mirrors)}")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_prefetch_mirror, url, entry, mirror): url
+            for url, (entry, mirror, _) in mirrors.items()
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except subprocess.CalledProcessError:
+                logger.warning(f"Failed to prefetch {futures[future]}")
+
+
 def parse_repo_url(url: str) -> Dict[str, str]:
     """
     Parses a GitHub url and returns a dict with:
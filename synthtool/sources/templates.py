@@ -12,24 +12,93 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Union, List
-from pathlib import Path
+import collections
+import concurrent.futures
+import functools
+import json
+import os
+import threading
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+    List,
+)
+from pathlib import Path, PurePath
 
 import jinja2
+import jinja2.defaults
+import jinja2.meta
 import re
 
+from synthtool import cache
 from synthtool import log
 from synthtool import tmp
 
 
 PathOrStr = Union[str, Path]
 
+BYTECODE_CACHE_NAMESPACE = "jinja"
+
+# Number of templates a TemplateGroup renders concurrently. Rendering mostly
+# holds the GIL, so threads are opt-in.
+RENDER_JOBS = int(os.environ.get("SYNTHTOOL_RENDER_JOBS", 1))
+
+# Also keep rendered templates in the synthtool cache, for later runs.
+PERSIST_RENDERS = bool(os.environ.get("SYNTHTOOL_PERSIST_RENDERS", False))
+RENDER_CACHE_NAMESPACE = "renders"
+
+# Number of rendered templates kept in memory.
+RENDER_MEMO_SIZE = 4096
+
+# Serve unchanged templates from the files a previous run wrote, see
+# TemplateGroup.
+INCREMENTAL_RENDERS = bool(os.environ.get("SYNTHTOOL_INCREMENTAL_RENDERS", False))
+MANIFEST_CACHE_NAMESPACE = "template-manifests"
+
+
+class _BytecodeCache(jinja2.BytecodeCache):
+    """Keeps compiled templates in the synthtool cache across processes.
+
+    Entries are keyed by the template's path, its mtime and the jinja version.
+    Jinja itself also checks the checksum of the source and the Python version.
+    """
+
+    def get_cache_key(self, name: str, filename: Optional[str] = None) -> str:
+        mtime = os.stat(filename).st_mtime_ns if filename else 0
+        return cache.make_key(jinja2.__version__, name, filename or "", str(mtime))
+
+    def load_bytecode(self, bucket: jinja2.bccache.Bucket) -> None:
+        data = cache.get_bytes(BYTECODE_CACHE_NAMESPACE, bucket.key)
+        if data is not None:
+            bucket.bytecode_from_string(data)
+
+    def dump_bytecode(self, bucket: jinja2.bccache.Bucket) -> None:
+        try:
+            cache.put_bytes(
+                BYTECODE_CACHE_NAMESPACE, bucket.key, bucket.bytecode_to_string()
+            )
+        except OSError as e:
+            log.debug(f"Could not cache compiled template {bucket.key}: {e}")
+
+
+@functools.lru_cache(maxsize=None)
+def bytecode_cache() -> jinja2.BytecodeCache:
+    """Returns the bytecode cache to pass to every jinja2.Environment."""
+    return _BytecodeCache()
+
 
 def _make_env(location):
     env = jinja2.Environment(
         loader=jinja2.FileSystemLoader(str(location)),
         autoescape=False,
         keep_trailing_newline=True,
+        bytecode_cache=bytecode_cache(),
     )
     env.filters["release_quality_badge"] = release_quality_badge
     env.filters["language_pretty"] = language_pretty
@@ -38,10 +107,196 @@ def _make_env(location):
     return env
 
 
+# Environments, template listings and template file modes are computed once
+# per process.
+_envs: Dict[str, jinja2.Environment] = {}
+_template_lists: Dict[int, Tuple[str, ...]] = {}
+_source_modes: Dict[str, int] = {}
+
+
+def _get_env(location: PathOrStr) -> jinja2.Environment:
+    """Returns the shared Environment for a template root.
+
+    Templates are only compiled once per process however many groups render
+    them. Globals set on the environment apply to every user of the root.
+    """
+    key = str(Path(location).resolve())
+    env = _envs.get(key)
+    if env is None:
+        env = _envs.setdefault(key, _make_env(location))
+    return env
+
+
+def _list_templates(env: jinja2.Environment) -> Tuple[str, ...]:
+    templates = _template_lists.get(id(env))
+    if templates is None:
+        templates = _template_lists.setdefault(id(env), tuple(env.list_templates()))
+    return templates
+
+
+def _get_source_mode(filename: str) -> int:
+    mode = _source_modes.get(filename)
+    if mode is None:
+        mode = _source_modes.setdefault(filename, Path(filename).stat().st_mode)
+    return mode
+
+
+class _Dependencies(NamedTuple):
+    # Context keys read by the template or the templates it references.
+    variables: FrozenSet[str]
+    # (name, source) of the template and of every template it references.
+    sources: Tuple[Tuple[str, str], ...]
+    # The loader's checks that the sources didn't change.
+    uptodate: Tuple[Callable[[], bool], ...]
+
+
+_dependencies: Dict[Tuple[int, str], Optional[_Dependencies]] = {}
+
+
+def _get_dependencies(
+    env: jinja2.Environment, template_name: str
+) -> Optional[_Dependencies]:
+    """Finds what the output of a template depends on, besides filters.
+
+    Returns None if the template references other templates dynamically.
+    """
+    key = (id(env), template_name)
+    dependencies = _dependencies.get(key)
+    if dependencies and all(uptodate() for uptodate in dependencies.uptodate):
+        return dependencies
+    if key in _dependencies and dependencies is None:
+        return None
+
+    variables = set()
+    sources: Dict[str, str] = {}
+    checks = []
+    pending = [template_name]
+    result: Optional[_Dependencies] = None
+    while pending:
+        name = pending.pop()
+        if name in sources:
+            continue
+        source, _, uptodate = env.loader.get_source(env, name)  # type: ignore
+        ast = env.parse(source)
+        sources[name] = source
+        if uptodate is not None:
+            checks.append(uptodate)
+        variables |= jinja2.meta.find_undeclared_variables(ast)
+        referenced = list(jinja2.meta.find_referenced_templates(ast))
+        if None in referenced:
+            break
+        pending.extend(referenced)  # type: ignore
+    else:
+        result = _Dependencies(
+            frozenset(variables), tuple(sorted(sources.items())), tuple(checks)
+        )
+
+    _dependencies[key] = result
+    return result
+
+
+def _to_json(value: Any) -> Any:
+    """Converts a context value to JSON that identifies how it renders.
+
+    Raises TypeError for values, like functions, that can't be identified.
+    """
+    if value is None or type(value) in (bool, int, float, str):
+        return value
+    if type(value) is list:
+        return [_to_json(item) for item in value]
+    if type(value) is tuple:
+        return {"tuple": [_to_json(item) for item in value]}
+    if type(value) is dict:
+        # Keeps insertion order, which loops over the dict render in.
+        return {"dict": [[_to_json(k), _to_json(v)] for k, v in value.items()]}
+    if isinstance(value, PurePath):
+        return {"path": str(value)}
+    raise TypeError(f"Can't identify {type(value)}")
+
+
+# Filters and jinja itself affect the output too.
+_RENDERER_KEY = cache.make_key(jinja2.__version__, Path(__file__).read_bytes())
+
+
+def _fingerprint(
+    env: jinja2.Environment, template_name: str, params: Dict[str, Any]
+) -> Optional[str]:
+    """Returns a key that identifies the output of rendering a template.
+
+    Only the context values the template reads are part of the key. Returns
+    None if the output can't be identified, e.g. the template calls a function
+    passed in the context.
+    """
+    dependencies = _get_dependencies(env, template_name)
+    if dependencies is None:
+        return None
+
+    values = {}
+    for name in sorted(dependencies.variables):
+        if name in params:
+            values[name] = params[name]
+        elif name in env.globals:
+            value = env.globals[name]
+            if value is not jinja2.defaults.DEFAULT_NAMESPACE.get(name):
+                values[name] = value
+    try:
+        encoded_values = json.dumps(_to_json(values))
+    except TypeError:
+        return None
+
+    return cache.make_key(
+        _RENDERER_KEY,
+        template_name,
+        *(f"{name}\0{source}" for name, source in dependencies.sources),
+        encoded_values,
+    )
+
+
+# Rendered templates by fingerprint, least recently used first.
+_renders: "collections.OrderedDict[str, str]" = collections.OrderedDict()
+_renders_lock = threading.Lock()
+
+
+def _render(env: jinja2.Environment, template: jinja2.Template, params) -> str:
+    """Renders a template, reusing the output of an identical earlier render.
+
+    Templates in mono-repos render to the same output for many packages. The
+    output is looked up by fingerprint in memory and, if PERSIST_RENDERS is
+    set, in the synthtool cache.
+    """
+    key = _fingerprint(env, template.name, params)  # type: ignore
+    if key is None:
+        return template.render(**params)
+
+    with _renders_lock:
+        output = _renders.get(key)
+        if output is not None:
+            _renders.move_to_end(key)
+            return output
+
+    if PERSIST_RENDERS:
+        data = cache.get_bytes(RENDER_CACHE_NAMESPACE, key)
+        if data is not None:
+            output = data.decode("utf-8")
+    if output is None:
+        output = template.render(**params)
+        if PERSIST_RENDERS:
+            try:
+                cache.put_bytes(RENDER_CACHE_NAMESPACE, key, output.encode("utf-8"))
+            except OSError as e:
+                log.debug(f"Could not cache rendered {template.name}: {e}")
+
+    with _renders_lock:
+        _renders[key] = output
+        while len(_renders) > RENDER_MEMO_SIZE:
+            _renders.popitem(last=False)
+    return output
+
+
 def _render_to_path(env, template_name, dest, params):
     template = env.get_template(template_name)
 
-    output = template.stream(**params)
+    output = _render(env, template, params)
 
     if template_name.endswith(".j2"):
         template_name = template.name[:-3]
@@ -50,19 +305,17 @@ def _render_to_path(env, template_name, dest, params):
     dest.parent.mkdir(parents=True, exist_ok=True)
 
     with dest.open("w") as fh:
-        output.dump(fh)
+        fh.write(output)
 
     # Copy file mode over
-    source_path = Path(template.filename)
-    mode = source_path.stat().st_mode
-    dest.chmod(mode)
+    dest.chmod(_get_source_mode(template.filename))
 
     return dest
 
 
 class Templates:
     def __init__(self, location: PathOrStr) -> None:
-        self.env = _make_env(location)
+        self.env = _get_env(location)
         self.source_path = Path(location)
         self.dir = tmp.tmpdir()
 
@@ -71,19 +324,130 @@ class Templates:
 
 
 class TemplateGroup:
-    def __init__(self, location: PathOrStr, excludes: List[str] = []) -> None:
-        self.env = _make_env(location)
+    """Renders every template of a directory.
+
+    If a destination is given, the group renders incrementally: the files the
+    rendered templates are eventually copied to are recorded, along with the
+    fingerprint of each template, in a manifest kept in the synthtool cache.
+    A template whose source and the context values it reads are unchanged
+    since the last render, and whose destination file still has the recorded
+    contents, is copied from the destination instead of being rendered.
+    """
+
+    def __init__(
+        self,
+        location: PathOrStr,
+        excludes: List[str] = [],
+        jobs: Optional[int] = None,
+        destination: Optional[PathOrStr] = None,
+    ) -> None:
+        self.env = _get_env(location)
+        self.source_path = Path(location)
         self.dir = tmp.tmpdir()
         self.excludes = excludes
+        self.jobs = jobs or RENDER_JOBS
+        self.destination = Path(destination) if destination is not None else None
 
-    def render(self, subdir: PathOrStr = ".", **kwargs) -> Path:
-        for template_name in self.env.list_templates():
-            if template_name not in self.excludes:
-                print(template_name)
-                _render_to_path(self.env, template_name, self.dir / subdir, kwargs)
-            else:
-                print(f"Skipping: {template_name}")
+    def _manifest_key(self) -> str:
+        assert self.destination is not None
+        return cache.make_key(
+            str(self.source_path.resolve()), str(self.destination.resolve())
+        )
+
+    def _load_manifest(self) -> Dict[str, List[str]]:
+        data = cache.get_bytes(MANIFEST_CACHE_NAMESPACE, self._manifest_key())
+        if data is None:
+            return {}
+        try:
+            return json.loads(data)
+        except ValueError:
+            return {}
+
+    def _save_manifest(self, manifest: Dict[str, List[str]]) -> None:
+        data = json.dumps(manifest, sort_keys=True).encode("utf-8")
+        try:
+            cache.put_bytes(MANIFEST_CACHE_NAMESPACE, self._manifest_key(), data)
+        except OSError as e:
+            log.debug(f"Could not save the manifest of {self.source_path}: {e}")
+
+    def _render_incremental(
+        self,
+        template_name: str,
+        subdir: PathOrStr,
+        params: Dict[str, Any],
+        manifest: Dict[str, List[str]],
+        updates: Dict[str, List[str]],
+    ) -> Optional[Path]:
+        """Renders a template unless its output is still at the destination.
+
+        Returns the path of the output if it was copied from the destination.
+        """
+        assert self.destination is not None
+        output_name = template_name
+        if output_name.endswith(".j2"):
+            output_name = output_name[:-3]
+        relative_path = (Path(subdir) / output_name).as_posix()
+        fingerprint = _fingerprint(self.env, template_name, params)
+
+        existing = self.destination / relative_path
+        recorded = manifest.get(relative_path)
+        if fingerprint is not None and recorded and recorded[0] == fingerprint:
+            try:
+                contents: Optional[bytes] = existing.read_bytes()
+            except OSError:
+                contents = None
+            if contents is not None and cache.make_key(contents) == recorded[1]:
+                path = self.dir / relative_path
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(contents)
+                template = self.env.get_template(template_name)
+                path.chmod(_get_source_mode(template.filename))  # type: ignore
+                updates[relative_path] = recorded
+                return path
+
+        path = _render_to_path(self.env, template_name, self.dir / subdir, params)
+        if fingerprint is not None:
+            updates[relative_path] = [fingerprint, cache.make_key(path.read_bytes())]
+        return None
 
+    def render(self, subdir: PathOrStr = ".", **kwargs) -> Path:
+        all_templates = _list_templates(self.env)
+        template_names = [name for name in all_templates if name not in self.excludes]
+        dest = self.dir / subdir
+
+        manifest = self._load_manifest() if self.destination is not None else {}
+        updates: Dict[str, List[str]] = {}
+        reused: List[Path] = []
+
+        def render_template(template_name: str) -> None:
+            if self.destination is None:
+                _render_to_path(self.env, template_name, dest, kwargs)
+                return
+            path = self._render_incremental(
+                template_name, subdir, kwargs, manifest, updates
+            )
+            if path is not None:
+                reused.append(path)
+
+        # Every template is written to its own file, so the output doesn't
+        # depend on the order they are rendered in.
+        if self.jobs > 1 and len(template_names) > 1:
+            with concurrent.futures.ThreadPoolExecutor(self.jobs) as executor:
+                list(executor.map(render_template, template_names))
+        else:
+            for template_name in template_names:
+                render_template(template_name)
+
+        if self.destination is not None and any(
+            manifest.get(path) != value for path, value in updates.items()
+        ):
+            self._save_manifest({**manifest, **updates})
+
+        log.debug(
+            f"Rendered {len(template_names) - len(reused)} templates from "
+            f"{self.source_path}, reused {len(reused)}, "
+            f"skipped {len(all_templates) - len(template_names)}"
+        )
         return self.dir
 
 
@@ -19,7 +19,7 @@ import os
 import re
 import sys
 
-from synthtool import _tracked_paths
+from synthtool import _parsed_files, _tracked_paths, _written_files
 from synthtool.log import logger
 from synthtool import metadata
 
@@ -145,6 +145,8 @@ def _copy_dir_to_existing_dir(
                         shutil.copy2(str(source_path), str(dest_path))
                 else:
                     shutil.copy2(str(source_path), str(dest_path))
+                _parsed_files.invalidate(dest_path)
+                _written_files.add(dest_path)
                 copied = True
 
     return copied
@@ -223,6 +225,12 @@ def move(
                     shutil.copy2(source, canonical_destination)
             else:
                 shutil.copy2(source, canonical_destination)
+            if canonical_destination.is_dir():
+                dest_path = canonical_destination / source.name
+            else:
+                dest_path = canonical_destination
+            _parsed_files.invalidate(dest_path)
+            _written_files.add(dest_path)
             copied = True
 
     if not copied:
@@ -284,6 +292,8 @@ def replace(
         replaced = _replace_in_file(path, expr, after)
         count_replaced += replaced
         if replaced:
+            _parsed_files.invalidate(path)
+            _written_files.add(path)
             logger.info(f"Replaced {before!r} in {path}.")
 
     if not count_replaced:
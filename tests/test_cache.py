@@ -0,0 +1,159 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import threading
+import time
+
+import pytest
+
+from synthtool import cache
+
+
+def _try_lock(path, shared, acquired):
+    with cache.lock(path, shared=shared):
+        acquired.set()
+
+
+def test_lock_exclusive_blocks_readers(tmp_path):
+    entry = tmp_path / "entry"
+    acquired = threading.Event()
+
+    with cache.lock(entry):
+        reader = threading.Thread(target=_try_lock, args=(entry, True, acquired))
+        reader.start()
+        assert not acquired.wait(0.2)
+    reader.join(5)
+    assert acquired.is_set()
+
+
+def test_lock_shared_allows_readers(tmp_path):
+    entry = tmp_path / "entry"
+    acquired = threading.Event()
+
+    with cache.lock(entry, shared=True):
+        reader = threading.Thread(target=_try_lock, args=(entry, True, acquired))
+        reader.start()
+        assert acquired.wait(5)
+    reader.join(5)
+
+
+def test_lock_shared_blocks_writers(tmp_path):
+    entry = tmp_path / "entry"
+    acquired = threading.Event()
+
+    with cache.lock(entry, shared=True):
+        writer = threading.Thread(target=_try_lock, args=(entry, False, acquired))
+        writer.start()
+        assert not acquired.wait(0.2)
+    writer.join(5)
+    assert acquired.is_set()
+    assert (tmp_path / "entry.lock").exists()
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "get_cache_dir", lambda: tmp_path)
+    monkeypatch.setattr(cache, "EVICTION_GRACE_PERIOD", 0)
+    return tmp_path
+
+
+def test_make_key():
+    assert cache.make_key("a", "bc") == cache.make_key("a", b"bc")
+    assert cache.make_key("a", "bc") != cache.make_key("ab", "c")
+
+
+def test_put_and_get_bytes(cache_dir):
+    key = cache.make_key("content")
+    assert cache.get_bytes("test", key) is None
+
+    path = cache.put_bytes("test", key, b"data")
+    assert path == cache_dir / "test" / key
+    assert cache.get_bytes("test", key) == b"data"
+    # No temporary files are left behind.
+    assert sorted(p.name for p in (cache_dir / "test").iterdir()) == [
+        ".namespace",
+        key,
+    ]
+
+
+def test_publish_directory(cache_dir):
+    with cache.staging("test") as staged:
+        staged.mkdir()
+        (staged / "file.txt").write_text("hello")
+        path = cache.publish("test", "key", staged)
+    assert (path / "file.txt").read_text() == "hello"
+
+    # Publishing the same key again keeps the existing entry.
+    with cache.staging("test") as staged:
+        staged.mkdir()
+        (staged / "other.txt").write_text("hello")
+        assert cache.publish("test", "key", staged) == path
+    assert (path / "file.txt").exists()
+
+
+def _age(path, seconds):
+    accessed = time.time() - seconds
+    os.utime(path, (accessed, accessed))
+
+
+def test_evict_least_recently_used(cache_dir):
+    old = cache.put_bytes("test", "old", b"x" * 10)
+    recent = cache.put_bytes("test", "recent", b"x" * 10)
+    used = cache.put_bytes("other", "used", b"x" * 10)
+    _age(old, 300)
+    _age(recent, 100)
+    _age(used, 200)
+    # Reading an entry records the access.
+    cache.get("other", "used")
+
+    assert cache.evict(max_size=15) == [old, recent]
+    assert used.exists()
+
+
+def test_evict_skips_locked_and_foreign_entries(cache_dir):
+    locked = cache.put_bytes("test", "locked", b"x" * 10)
+    _age(locked, 100)
+    foreign = cache_dir / "not-a-namespace" / "file"
+    foreign.parent.mkdir()
+    foreign.write_bytes(b"x" * 10)
+
+    with cache.lock(locked, shared=True):
+        assert cache.evict(max_size=0) == []
+    assert foreign.exists()
+    assert cache.evict(max_size=0) == [locked]
+
+
+def test_evict_respects_grace_period(cache_dir, monkeypatch):
+    monkeypatch.setattr(cache, "EVICTION_GRACE_PERIOD", 60)
+    cache.put_bytes("test", "fresh", b"x" * 10)
+    assert cache.evict(max_size=0) == []
+
+
+def test_evict_at_exit_once_per_interval(cache_dir, monkeypatch):
+    monkeypatch.setattr(cache, "MAX_SIZE", 5)
+    monkeypatch.setattr(cache, "_used", True)
+    first = cache.put_bytes("test", "first", b"x" * 10)
+    _age(first, 100)
+    cache._evict_at_exit()
+    assert not first.exists()
+
+    second = cache.put_bytes("test", "second", b"x" * 10)
+    _age(second, 100)
+    cache._evict_at_exit()
+    assert second.exists()
+
+    _age(cache_dir / ".evicted", cache.EVICTION_INTERVAL + 1)
+    cache._evict_at_exit()
+    assert not second.exists()
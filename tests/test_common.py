@@ -21,6 +21,8 @@ from unittest import mock
 from pytest import raises
 
 import synthtool as s
+from synthtool import _tracked_paths, metadata
+from synthtool.sources import git
 from synthtool.gcp.common import _get_default_branch_name, decamelize, detect_versions
 
 from . import util
@@ -251,3 +253,43 @@ def test_detect_versions_nested_directory():
         assert ["v1", "v3", "v2"] == versions
         versions = detect_versions(default_version="v3")
         assert ["v1", "v2", "v3"] == versions
+
+
+def test_detect_versions_shallowest_level():
+    temp_dir = Path(tempfile.mkdtemp())
+    os.makedirs(temp_dir / "a" / "v2")
+    os.makedirs(temp_dir / "b" / "v1" / "v3")
+    os.makedirs(temp_dir / "c" / "d" / "v4")
+    (temp_dir / "e").mkdir()
+    (temp_dir / "e" / "v5").write_text("not a directory")
+
+    versions = detect_versions(temp_dir)
+    assert ["v1", "v2"] == versions
+
+
+def test_common_templates_record_template_source(monkeypatch):
+    monkeypatch.setattr(s.gcp.common, "LOCAL_TEMPLATES", None)
+    monkeypatch.setattr(git, "_clone_results", {})
+    root = template_dir.parent.parent.parent
+    try:
+        with mock.patch.object(
+            git, "_clone", return_value=(root, "abc123", "message")
+        ) as clone:
+            first = s.gcp.CommonTemplates()
+            # As a mono-repo does between packages.
+            metadata.reset()
+            _tracked_paths.reset()
+            second = s.gcp.CommonTemplates()
+        clone.assert_called_once()
+        assert [source.git.sha for source in metadata.get().sources] == ["abc123"]
+        assert _tracked_paths.relativize(template_dir) == Path(
+            s.gcp.common.DEFAULT_TEMPLATES_PATH
+        )
+    finally:
+        metadata.reset()
+        _tracked_paths.reset()
+    assert first._template_root == second._template_root == template_dir
+
+    # Each instance keeps its own excludes.
+    first.excludes.append("README.md")
+    assert second.excludes == []
@@ -12,9 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import concurrent.futures
 import copy
 import importlib
 import os
+import pathlib
+import shutil
+import subprocess
 import unittest
 from unittest import mock
 
@@ -26,6 +30,8 @@ from synthtool import metadata, tmp
 from synthtool.protos.preconfig_pb2 import Preconfig
 from synthtool.sources import git
 
+from . import util
+
 
 def test_make_repo_clone_url(monkeypatch):
     monkeypatch.setattr(git, "USE_SSH", True)
@@ -95,9 +101,9 @@ class TestClone(unittest.TestCase):
         self.assertEqual("nodejs-vision", local_directory.name)
         self.assertEqual("nodejs-vision", metadata.get().sources[0].git.name)
 
-        # When the repo already exists, it should pull instead.
+        # When the repo already exists, it should fetch and reuse the checkout.
         same_local_directory = git.clone(
-            "https://github.com/googleapis/nodejs-vision.git", local_directory.parent
+            "https://github.com/googleapis/nodejs-vision.git"
         )
         self.assertEqual(local_directory, same_local_directory)
 
@@ -127,3 +133,233 @@ class TestClone(unittest.TestCase):
         self.assertEqual(local_directory, same_local_directory)
         # Make sure it was recorded in the metadata.
         self.assertEqual("nodejs-vision", metadata.get().sources[0].git.name)
+
+
+def _commit(repo: pathlib.Path, text: str) -> str:
+    (repo / "file.txt").write_text(text)
+    util.commit_all(repo, text)
+    return git.get_latest_commit(repo)[0]
+
+
+@pytest.fixture(autouse=True)
+def reset_fetched_mirrors():
+    git._fetched_mirrors.clear()
+    git._clone_results.clear()
+
+
+@pytest.fixture
+def upstream(tmp_path):
+    repo = tmp_path / "upstream"
+    repo.mkdir()
+    util.git(repo, "init", "-b", "main")
+    return repo
+
+
+def test_clone_local_mirror_and_worktrees(upstream, tmp_path):
+    first = _commit(upstream, "first")
+    second = _commit(upstream, "second")
+    cache_dir = tmp_path / "cache"
+
+    latest = git.clone(str(upstream), cache_dir)
+    assert latest.name == "upstream"
+    assert latest.parent.name == second
+    assert (latest / "file.txt").read_text() == "second"
+    assert (cache_dir / "upstream" / "mirror.git").is_dir()
+
+    older = git.clone(str(upstream), cache_dir, committish=first)
+    assert older != latest
+    assert (older / "file.txt").read_text() == "first"
+    # The checkout of the latest commit is left untouched.
+    assert (latest / "file.txt").read_text() == "second"
+
+
+def test_clone_local_fetches_new_commits(upstream, tmp_path):
+    _commit(upstream, "first")
+    cache_dir = tmp_path / "cache"
+    git.clone(str(upstream), cache_dir)
+
+    third = _commit(upstream, "third")
+    # A new process fetches again.
+    git._fetched_mirrors.clear()
+    git._clone_results.clear()
+    latest = git.clone(str(upstream), cache_dir)
+    assert latest.parent.name == third
+    assert (latest / "file.txt").read_text() == "third"
+
+
+def test_clone_local_force(upstream, tmp_path):
+    _commit(upstream, "first")
+    cache_dir = tmp_path / "cache"
+    local = git.clone(str(upstream), cache_dir)
+    (local / "file.txt").write_text("modified")
+
+    local = git.clone(str(upstream), cache_dir, force=True)
+    assert (local / "file.txt").read_text() == "first"
+
+
+def test_clone_prunes_least_recently_used_worktrees(upstream, tmp_path, monkeypatch):
+    first, second, third = [_commit(upstream, text) for text in ("a", "b", "c")]
+    cache_dir = tmp_path / "cache"
+    worktrees = cache_dir / "upstream" / "worktrees"
+    monkeypatch.setattr(git, "MAX_WORKTREES", 2)
+
+    for sha in (first, second):
+        git.clone(str(upstream), cache_dir, committish=sha)
+    # Simulate a new process, where first was used long ago.
+    git._clone_results.clear()
+    os.utime(worktrees / first, (0, 0))
+    git.clone(str(upstream), cache_dir, committish=third)
+
+    assert sorted(path.name for path in worktrees.iterdir()) == sorted([second, third])
+    listed = subprocess.check_output(
+        ["git", "worktree", "list"], cwd=cache_dir / "upstream" / "mirror.git"
+    ).decode("utf-8")
+    assert first not in listed
+    # A pruned commit is checked out again.
+    local = git.clone(str(upstream), cache_dir, committish=first)
+    assert (local / "file.txt").read_text() == "a"
+
+
+def test_clone_keeps_recently_used_worktrees(upstream, tmp_path, monkeypatch):
+    shas = [_commit(upstream, text) for text in ("a", "b", "c")]
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(git, "MAX_WORKTREES", 1)
+
+    for sha in shas:
+        # Each commit is checked out by another process, which may still use it.
+        git._clone_results.clear()
+        git.clone(str(upstream), cache_dir, committish=sha)
+
+    worktrees = cache_dir / "upstream" / "worktrees"
+    assert sorted(path.name for path in worktrees.iterdir()) == sorted(shas)
+
+
+def test_clone_checks_out_worktree_pruned_by_another_process(upstream, tmp_path):
+    _commit(upstream, "first")
+    cache_dir = tmp_path / "cache"
+    local = git.clone(str(upstream), cache_dir)
+    shutil.rmtree(local.parent)
+
+    assert git.clone(str(upstream), cache_dir) == local
+    assert (local / "file.txt").read_text() == "first"
+
+
+def test_clone_keeps_worktrees_used_by_this_process(upstream, tmp_path, monkeypatch):
+    shas = [_commit(upstream, text) for text in ("a", "b", "c")]
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(git, "MAX_WORKTREES", 1)
+
+    results = [git.clone(str(upstream), cache_dir, committish=sha) for sha in shas]
+    for local, text in zip(results, ("a", "b", "c")):
+        assert (local / "file.txt").read_text() == text
+
+
+def test_prefetch_then_clone_does_not_fetch_again(upstream, tmp_path):
+    sha = _commit(upstream, "first")
+    cache_dir = tmp_path / "cache"
+
+    git.prefetch([str(upstream)], cache_dir)
+    assert (cache_dir / "upstream" / "mirror.git").is_dir()
+
+    with mock.patch.object(git, "_update_mirror") as update_mirror:
+        local = git.clone(str(upstream), cache_dir)
+    update_mirror.assert_not_called()
+    assert local.parent.name == sha
+
+
+def test_prefetch_failure_is_not_fatal(tmp_path):
+    git.prefetch([str(tmp_path / "does-not-exist")], tmp_path / "cache")
+
+
+def test_clone_is_memoized_per_process(upstream, tmp_path):
+    _commit(upstream, "first")
+    cache_dir = tmp_path / "cache"
+    local = git.clone(str(upstream), cache_dir)
+
+    with mock.patch("subprocess.run") as run, mock.patch(
+        "subprocess.check_output"
+    ) as check_output:
+        assert git.clone(str(upstream), cache_dir) == local
+    run.assert_not_called()
+    check_output.assert_not_called()
+
+
+def test_clone_reuses_fresh_mirror_within_ttl(upstream, tmp_path, monkeypatch):
+    _commit(upstream, "first")
+    cache_dir = tmp_path / "cache"
+    local = git.clone(str(upstream), cache_dir)
+
+    # Simulate a new process.
+    git._fetched_mirrors.clear()
+    git._clone_results.clear()
+    monkeypatch.setattr(git, "FETCH_TTL", 60)
+    with mock.patch("subprocess.run") as run, mock.patch(
+        "subprocess.check_output"
+    ) as check_output:
+        assert git.clone(str(upstream), cache_dir) == local
+    run.assert_not_called()
+    check_output.assert_not_called()
+
+
+def test_clone_refetches_unknown_committish_within_ttl(upstream, tmp_path, monkeypatch):
+    _commit(upstream, "first")
+    cache_dir = tmp_path / "cache"
+    git.clone(str(upstream), cache_dir)
+
+    git._fetched_mirrors.clear()
+    git._clone_results.clear()
+    monkeypatch.setattr(git, "FETCH_TTL", 60)
+    second = _commit(upstream, "second")
+    local = git.clone(str(upstream), cache_dir, committish=second)
+    assert (local / "file.txt").read_text() == "second"
+
+
+def test_clone_rewrites_corrupt_commit_stamp(upstream, tmp_path, monkeypatch):
+    sha = _commit(upstream, "first")
+    cache_dir = tmp_path / "cache"
+    local = git.clone(str(upstream), cache_dir)
+    stamp = local.parent / git._COMMIT_STAMP
+    stamp.write_text(sha[:10])
+
+    git._fetched_mirrors.clear()
+    git._clone_results.clear()
+    monkeypatch.setattr(git, "FETCH_TTL", 60)
+    assert git.clone(str(upstream), cache_dir) == local
+    assert stamp.read_text().startswith(f"{sha}\nfirst")
+
+
+def test_write_stamp_keeps_previous_content_on_failure(tmp_path):
+    stamp = tmp_path / "stamp"
+    git._write_stamp(stamp, "first")
+    with mock.patch("os.replace", side_effect=OSError), pytest.raises(OSError):
+        git._write_stamp(stamp, "second")
+    assert stamp.read_text() == "first"
+    assert os.listdir(tmp_path) == ["stamp"]
+
+
+def test_clone_precloned_skips_reset_at_requested_sha(upstream, monkeypatch):
+    sha = _commit(upstream, "first")
+    monkeypatch.setattr(git, "get_preclone", lambda url: str(upstream))
+
+    with mock.patch.object(git.shell, "run") as run:
+        assert git.clone("https://example.com/upstream.git", committish=sha) == (
+            upstream
+        )
+    run.assert_not_called()
+
+
+def test_clone_concurrently(upstream, tmp_path):
+    shas = [_commit(upstream, text) for text in ("first", "second", "third")]
+    cache_dir = tmp_path / "cache"
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(
+            executor.map(
+                lambda sha: git.clone(str(upstream), cache_dir, committish=sha),
+                shas,
+            )
+        )
+
+    for sha, text, local in zip(shas, ("first", "second", "third"), results):
+        assert local.parent.name == sha
+        assert (local / "file.txt").read_text() == text
@@ -17,6 +17,8 @@ from pathlib import Path
 import json
 import shutil
 
+from . import util
+
 FIXTURES_SAMPLES = Path(__file__).parent / "fixtures" / "samples" / "generated"
 
 
@@ -67,3 +69,43 @@ def test_update_library_version():
         assert new_data["clientLibrary"]["version"] == "1234"
 
     shutil.rmtree(Path.resolve(FIXTURES_SAMPLES / "temp"))
+
+
+def test_find_dirs(tmp_path):
+    for path in (
+        "a/.OwlBot.yaml",
+        "a/src/nested/.OwlBot.yaml",
+        "b/node_modules/c/.OwlBot.yaml",
+        "d/e/f/.OwlBot.yaml",
+    ):
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).touch()
+
+    def find(**kwargs):
+        return sorted(
+            str(Path(d).relative_to(tmp_path))
+            for d in common.find_dirs(tmp_path, **kwargs)
+        )
+
+    assert find(marker=".OwlBot.yaml") == ["a", "a/src/nested", "d/e/f"]
+    assert find(marker=".OwlBot.yaml", stop_at_match=True) == ["a", "d/e/f"]
+    assert find(marker=".OwlBot.yaml", max_depth=2) == ["a"]
+    assert find(max_depth=1) == ["a", "b", "d"]
+    assert common.find_dirs(tmp_path / "missing") == []
+
+
+def test_get_changed_files(tmp_path):
+    for path in ("packages/a/index.ts", "packages/b/index.ts"):
+        Path(tmp_path, path).parent.mkdir(parents=True, exist_ok=True)
+        Path(tmp_path, path).write_text(path)
+    util.make_feature_branch(tmp_path)
+    util.git(tmp_path, "mv", "packages/a/index.ts", "packages/b/moved.ts")
+    Path(tmp_path, "packages", "c").mkdir()
+    Path(tmp_path, "packages", "c", "\u00e9 t.ts").write_text("")
+    util.commit_all(tmp_path, "b")
+
+    assert sorted(common.get_changed_files(tmp_path, "main")) == [
+        "packages/a/index.ts",
+        "packages/b/moved.ts",
+        "packages/c/\u00e9 t.ts",
+    ]
@@ -23,9 +23,11 @@ from datetime import date
 import pytest
 import json
 import shutil
+import subprocess
 
 from synthtool.languages import node_mono_repo
-from synthtool import transforms
+from synthtool import _written_files, shell, transforms
+from synthtool.log import logger
 from . import util
 
 FIXTURES = Path(__file__).parent / "fixtures"
@@ -442,6 +444,66 @@ class TestPostprocess(TestCase):
         )
 
 
+def test_fix_hermetic_links_node_modules(tmp_path, monkeypatch):
+    tools = tmp_path / "tools"
+    (tools / "node_modules").mkdir(parents=True)
+    monkeypatch.setattr(node_mono_repo, "_TOOLS_DIRECTORY", str(tools))
+    library = tmp_path / "library"
+    library.mkdir()
+
+    def run(args, **kwargs):
+        node_modules = library / "node_modules"
+        assert node_modules.is_symlink()
+        assert node_modules.resolve() == tools / "node_modules"
+
+    with patch("synthtool.shell.run", side_effect=run) as shell_run_mock:
+        node_mono_repo.fix_hermetic(library)
+    (args,), _ = shell_run_mock.call_args
+    assert args == [f"{tools}/node_modules/.bin/gts", "fix"]
+    assert not (library / "node_modules").exists()
+
+
+def test_fix_hermetic_replaces_stale_node_modules_link(tmp_path, monkeypatch):
+    tools = tmp_path / "tools"
+    (tools / "node_modules").mkdir(parents=True)
+    monkeypatch.setattr(node_mono_repo, "_TOOLS_DIRECTORY", str(tools))
+    library = tmp_path / "library"
+    library.mkdir()
+    # Left behind by a run that was killed.
+    (library / "node_modules").symlink_to(tools / "node_modules")
+
+    with patch("synthtool.shell.run") as shell_run_mock:
+        node_mono_repo.fix_hermetic(library)
+    (args,), _ = shell_run_mock.call_args
+    assert shell_run_mock.call_count == 1
+    assert args == [f"{tools}/node_modules/.bin/gts", "fix"]
+    assert not (library / "node_modules").is_symlink()
+
+
+def test_fix_hermetic_written_files_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(_written_files, "FORMAT_WRITTEN_ONLY", True)
+    monkeypatch.setattr(_written_files, "_written", set())
+    with patch("synthtool.shell.run") as shell_run_mock:
+        node_mono_repo.fix_hermetic(tmp_path)
+    shell_run_mock.assert_not_called()
+
+    _written_files.add(tmp_path / "src" / "index.ts")
+    _written_files.add(tmp_path / "README.md")
+    with patch("synthtool.shell.run") as shell_run_mock:
+        node_mono_repo.fix_hermetic(tmp_path)
+    (args,), _ = shell_run_mock.call_args
+    assert args[1:] == ["fix", "src/index.ts"]
+
+
+def test_fix_hermetic_copies_into_existing_node_modules(tmp_path):
+    (tmp_path / "node_modules").mkdir()
+    with patch("synthtool.shell.run") as shell_run_mock:
+        node_mono_repo.fix_hermetic(tmp_path)
+    calls = [" ".join(call[0][0]) for call in shell_run_mock.call_args_list]
+    assert calls[0] == "cp -r /synthtool/node_modules ."
+    assert (tmp_path / "node_modules").is_dir()
+
+
 @pytest.fixture
 def nodejs_mono_repo():
     """chdir to a copy of nodejs-dlp-with-staging."""
@@ -580,12 +642,74 @@ def test_walk_through_owlbot_dirs_no_staging(mock_subproc_popen):
         assert not any(re.search("owl-bot-staging", d) for d in unique_owlbot_dirs)
 
 
-@patch("synthtool.languages.node_mono_repo.walk_through_owlbot_dirs")
+@patch(
+    "synthtool.languages.node_mono_repo.walk_through_changed_owlbot_dirs",
+    return_value=([], []),
+)
 def test_entrypoint_args_with_no_arg(hermetic_mock, nodejs_mono_repo):
     node_mono_repo.owlbot_entrypoint()
-    node_mono_repo.walk_through_owlbot_dirs.assert_called_with(
-        Path.cwd(), search_for_changed_files=True
-    )
+    node_mono_repo.walk_through_changed_owlbot_dirs.assert_called_with(Path.cwd())
+
+
+def test_walk_through_changed_owlbot_dirs(tmp_path):
+    for package in ("packages/a", "packages/b", "core/c", "core/c/nested"):
+        Path(tmp_path, package).mkdir(parents=True, exist_ok=True)
+        Path(tmp_path, package, ".OwlBot.yaml").write_text("")
+    util.make_feature_branch(tmp_path)
+    Path(tmp_path, "packages", "b", "src").mkdir()
+    Path(tmp_path, "packages", "b", "src", "index.ts").write_text("")
+    Path(tmp_path, "core", "c", "nested", "package.json").write_text("")
+    util.commit_all(tmp_path, "b")
+
+    with util.chdir(tmp_path), patch("subprocess.run", wraps=subprocess.run) as run:
+        changed_dirs, all_dirs = node_mono_repo.walk_through_changed_owlbot_dirs(
+            tmp_path
+        )
+    diffs = [c for c in run.call_args_list if "diff" in c.args[0]]
+    assert len(diffs) == 1
+    assert sorted(changed_dirs) == [
+        f"{tmp_path}/core/c",
+        f"{tmp_path}/core/c/nested",
+        f"{tmp_path}/packages/b",
+    ]
+    assert len(all_dirs) == 4
+
+
+def test_walk_through_changed_owlbot_dirs_changed_and_staged(tmp_path):
+    for package in ("packages/a", "packages/b"):
+        Path(tmp_path, package).mkdir(parents=True)
+        Path(tmp_path, package, ".OwlBot.yaml").write_text("")
+    util.make_feature_branch(tmp_path)
+    Path(tmp_path, "packages", "b", "index.ts").write_text("")
+    util.commit_all(tmp_path, "b")
+    Path(tmp_path, "owl-bot-staging", "b", "v1").mkdir(parents=True)
+    Path(tmp_path, "owl-bot-staging", "b", "v1", "index.ts").write_text("")
+
+    with util.chdir(tmp_path):
+        changed_dirs, all_dirs = node_mono_repo.walk_through_changed_owlbot_dirs(
+            tmp_path
+        )
+    assert changed_dirs == [f"{tmp_path}/packages/b"]
+    assert sorted(all_dirs) == [f"{tmp_path}/packages/a", f"{tmp_path}/packages/b"]
+
+
+def test_walk_through_changed_owlbot_dirs_renamed_and_non_ascii(tmp_path):
+    for package in ("packages/a", "packages/b", "packages/c"):
+        Path(tmp_path, package).mkdir(parents=True)
+        Path(tmp_path, package, ".OwlBot.yaml").write_text("")
+    Path(tmp_path, "packages", "a", "index.ts").write_text("export {};\n")
+    util.make_feature_branch(tmp_path)
+    util.git(tmp_path, "mv", "packages/a/index.ts", "packages/b/index.ts")
+    Path(tmp_path, "packages", "c", "\u00e9.ts").write_text("")
+    util.commit_all(tmp_path, "b")
+
+    with util.chdir(tmp_path):
+        changed_dirs, _ = node_mono_repo.walk_through_changed_owlbot_dirs(tmp_path)
+    assert sorted(changed_dirs) == [
+        f"{tmp_path}/packages/a",
+        f"{tmp_path}/packages/b",
+        f"{tmp_path}/packages/c",
+    ]
 
 
 # postprocess_gapic_library_hermetic() must be mocked because it depends on node modules
@@ -776,3 +900,121 @@ def test_generated_readme(hermetic_mock, nodejs_mono_repo):
         assert ",googleapis-test/nodejs-dlp/samples/README.md" in readme_text
         # client_documentation from .repo-metadata.json is included in README.
         assert "https://googleapis.dev/nodejs/dlp/latest" in readme_text
+
+
+def _fake_owlbot_main(relative_dir, *args):
+    logger.info(f"Processing {relative_dir}")
+    shell.run(["echo", f"output of {relative_dir}"], hide_output=False)
+    if relative_dir == "packages/b":
+        raise ValueError("b failed")
+
+
+@patch("synthtool.languages.node_mono_repo.owlbot_main", side_effect=_fake_owlbot_main)
+def test_entrypoint_parallel_keep_going(owlbot_main_mock, tmp_path, capsys):
+    with util.chdir(tmp_path):
+        with pytest.raises(RuntimeError, match="failed for 1 packages: packages/b"):
+            node_mono_repo.owlbot_entrypoint(
+                specified_owlbot_dirs=["packages/a", "packages/b", "packages/c"],
+                jobs=3,
+                keep_going=True,
+            )
+    assert owlbot_main_mock.call_count == 3
+    out = capsys.readouterr().out
+    for name in ("a", "b", "c"):
+        assert f"Processing packages/{name}\n" in out
+        assert f"output of packages/{name}\n" in out
+
+
+@patch("synthtool.languages.node_mono_repo.owlbot_main", side_effect=_fake_owlbot_main)
+def test_entrypoint_parallel_fail_fast(owlbot_main_mock, tmp_path):
+    with util.chdir(tmp_path):
+        with pytest.raises(ValueError, match="b failed"):
+            node_mono_repo.owlbot_entrypoint(
+                specified_owlbot_dirs=["packages/a", "packages/b"], jobs=2
+            )
+
+
+@patch("synthtool.shell.run")
+def test_entrypoint_batches_newprocess(run_mock, tmp_path):
+    with util.chdir(tmp_path):
+        for name in ("a", "b"):
+            Path("packages", name).mkdir(parents=True)
+        node_mono_repo.owlbot_entrypoint(
+            specified_owlbot_dirs=["packages/b", "packages/a"], jobs=2
+        )
+    run_mock.assert_called_once_with(
+        [
+            "node",
+            node_mono_repo._NEWPROCESS_SCRIPT,
+            "--concurrency=2",
+            str(tmp_path / "packages" / "a"),
+            str(tmp_path / "packages" / "b"),
+        ]
+    )
+    assert node_mono_repo._batched_libraries is None
+
+
+_owlbot_main = node_mono_repo.owlbot_main
+
+
+def _owlbot_main_failing_b(relative_dir, *args):
+    if relative_dir == "packages/b":
+        raise ValueError("b failed")
+    _owlbot_main(relative_dir, *args)
+
+
+@patch("synthtool.shell.run")
+@patch(
+    "synthtool.languages.node_mono_repo.owlbot_main",
+    side_effect=_owlbot_main_failing_b,
+)
+def test_entrypoint_batches_newprocess_on_failure(owlbot_main_mock, run_mock, tmp_path):
+    with util.chdir(tmp_path):
+        for name in ("a", "b"):
+            Path("packages", name).mkdir(parents=True)
+        with pytest.raises(ValueError, match="b failed"):
+            node_mono_repo.owlbot_entrypoint(
+                specified_owlbot_dirs=["packages/a", "packages/b"]
+            )
+    run_mock.assert_called_once_with(
+        [
+            "node",
+            node_mono_repo._NEWPROCESS_SCRIPT,
+            "--concurrency=1",
+            str(tmp_path / "packages" / "a"),
+        ]
+    )
+    assert node_mono_repo._batched_libraries is None
+
+
+def test_owlbot_py_package_recorded_after_the_whole_script(tmp_path, monkeypatch):
+    monkeypatch.setattr(node_mono_repo._package_cache, "ENABLED", True)
+    monkeypatch.setenv("SYNTHTOOL_PACKAGE_CACHE", "1")
+    package = tmp_path / "packages" / "a"
+    package.mkdir(parents=True)
+    # Stands for an owlbot.py that edits the package after owlbot_main().
+    (package / "owlbot.py").write_text(
+        "import os\n"
+        "with open(os.path.join(os.path.dirname(__file__), 'runs.txt'), 'a') as f:\n"
+        "    f.write(os.environ.get('SYNTHTOOL_PACKAGE_CACHE', 'disabled') + '\\n')\n"
+    )
+    args = (None, None, None, node_mono_repo._noop)
+    with util.chdir(tmp_path):
+        node_mono_repo._process_owlbot_dir("packages/a", *args)
+        node_mono_repo._process_owlbot_dir("packages/a", *args)
+    # The script's own owlbot_main() doesn't record the package.
+    assert (package / "runs.txt").read_text() == "disabled\n"
+
+
+def test_owlbot_py_package_not_recorded_on_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(node_mono_repo._package_cache, "ENABLED", True)
+    package = tmp_path / "packages" / "a"
+    package.mkdir(parents=True)
+    (package / "owlbot.py").write_text("raise SystemExit(1)\n")
+    args = (None, None, None, node_mono_repo._noop)
+    with util.chdir(tmp_path), patch.object(
+        node_mono_repo._package_cache, "record"
+    ) as record_mock:
+        with pytest.raises(subprocess.CalledProcessError):
+            node_mono_repo._process_owlbot_dir("packages/a", *args)
+    record_mock.assert_not_called()
@@ -0,0 +1,86 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+import pytest
+
+from synthtool import _package_cache, cache
+from synthtool.languages import php
+
+
+@pytest.fixture
+def package_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "get_cache_dir", lambda: tmp_path / "cache")
+    monkeypatch.setattr(_package_cache, "ENABLED", True)
+
+
+def _make_package(root):
+    (root / "staging" / "v1").mkdir(parents=True)
+    (root / "staging" / "v1" / "client.txt").write_text("client")
+    (root / "package").mkdir()
+    (root / "package" / "owlbot.py").write_text("# owlbot")
+    (root / "package" / "node_modules").mkdir()
+
+
+def _fingerprint(root, **kwargs):
+    return _package_cache.fingerprint(
+        staging=root / "staging", files=[root / "package" / "owlbot.py"], **kwargs
+    )
+
+
+def test_is_unchanged(package_cache, tmp_path):
+    _make_package(tmp_path)
+    package = tmp_path / "package"
+    fingerprint = _fingerprint(tmp_path)
+    assert not _package_cache.is_unchanged(package, fingerprint)
+    assert not _package_cache.is_unchanged(package, None)
+
+    _package_cache.record(package, fingerprint)
+    assert _package_cache.is_unchanged(package, _fingerprint(tmp_path))
+
+    # Dependency directories aren't part of the package tree.
+    (package / "node_modules" / "dependency.js").write_text("dependency")
+    assert _package_cache.is_unchanged(package, fingerprint)
+
+    (package / "README.md").write_text("edited")
+    assert not _package_cache.is_unchanged(package, fingerprint)
+
+
+def test_fingerprint_inputs(package_cache, tmp_path):
+    _make_package(tmp_path)
+    fingerprint = _fingerprint(tmp_path)
+    assert _fingerprint(tmp_path, options=["excludes"]) != fingerprint
+
+    (tmp_path / "package" / "owlbot.py").write_text("# changed")
+    assert _fingerprint(tmp_path) != fingerprint
+
+    (tmp_path / "staging" / "v1" / "client.txt").write_text("changed")
+    assert _fingerprint(tmp_path) != fingerprint
+
+
+def test_php_owlbot_main_skips_unchanged_package(package_cache, tmp_path):
+    _make_package(tmp_path)
+    src, dest = tmp_path / "staging", tmp_path / "package"
+
+    with mock.patch.object(php, "owlbot_copy_version") as copy_version:
+        php.owlbot_main(src, dest)
+        php.owlbot_main(src, dest)
+    copy_version.assert_called_once()
+
+    (src / "v2").mkdir()
+    (src / "v2" / "client.txt").write_text("client")
+    with mock.patch.object(php, "owlbot_copy_version") as copy_version:
+        php.owlbot_main(src, dest)
+    assert copy_version.call_count == 2
@@ -0,0 +1,74 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+from unittest import mock
+
+import pytest
+
+from synthtool import _parsed_files, transforms
+
+
+def test_load_json_parses_once(tmp_path):
+    path = tmp_path / "package.json"
+    path.write_text(json.dumps({"name": "a", "keywords": ["x"]}))
+
+    with mock.patch("json.load", side_effect=json.load) as load:
+        first = _parsed_files.load_json(path)
+        second = _parsed_files.load_json(str(path))
+    assert load.call_count == 1
+    assert first == second == {"name": "a", "keywords": ["x"]}
+
+    # Callers get their own copy.
+    first["keywords"].append("y")
+    assert _parsed_files.load_json(path) == {"name": "a", "keywords": ["x"]}
+
+
+def test_load_json_detects_changes(tmp_path):
+    path = tmp_path / ".repo-metadata.json"
+    path.write_text('{"default_version": "v1"}')
+    mtime = path.stat().st_mtime_ns
+    assert _parsed_files.load_json(path) == {"default_version": "v1"}
+
+    path.write_text('{"default_version": "v2beta1"}')
+    os.utime(path, ns=(mtime, mtime))
+    assert _parsed_files.load_json(path) == {"default_version": "v2beta1"}
+
+    # A same size rewrite within the mtime resolution needs an invalidation.
+    path.write_text('{"default_version": "v2beta2"}')
+    os.utime(path, ns=(mtime, mtime))
+    assert _parsed_files.load_json(path) == {"default_version": "v2beta1"}
+    _parsed_files.invalidate(path)
+    assert _parsed_files.load_json(path) == {"default_version": "v2beta2"}
+
+
+def test_load_yaml(tmp_path):
+    path = tmp_path / ".readme-partials.yaml"
+    path.write_text("body: hello\n")
+    assert _parsed_files.load_yaml(path) == {"body": "hello"}
+    with pytest.raises(FileNotFoundError):
+        _parsed_files.load_yaml(tmp_path / "missing.yaml")
+
+
+def test_transforms_invalidate(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "package.json"
+    path.write_text('{"name": "aaa"}')
+    mtime = path.stat().st_mtime_ns
+    assert _parsed_files.load_json(path) == {"name": "aaa"}
+
+    transforms.replace(["package.json"], "aaa", "bbb")
+    os.utime(path, ns=(mtime, mtime))
+    assert _parsed_files.load_json(path) == {"name": "bbb"}
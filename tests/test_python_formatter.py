@@ -0,0 +1,329 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import subprocess
+import sys
+import time
+from unittest import mock
+
+import pytest
+
+from synthtool import cache, shell
+from synthtool.languages import _python_formatter
+
+LIBRARY_NOXFILE = '''
+import nox
+
+BLACK_VERSION = "black[jupyter]==23.7.0"
+ISORT_VERSION = "isort==5.11.0"
+LINT_PATHS = ["docs", "google", "tests", "noxfile.py", "setup.py"]
+
+
+@nox.session(python="3.10")
+def format(session):
+    """Run isort, then black."""
+    session.install(BLACK_VERSION, ISORT_VERSION)
+    session.run(
+        "isort",
+        "--fss",
+        *LINT_PATHS,
+    )
+    session.run(
+        "black",
+        *LINT_PATHS,
+    )
+'''
+
+SAMPLES_NOXFILE = """
+import os
+
+import nox
+
+BLACK_VERSION = "black==23.7.0"
+ISORT_VERSION = "isort==5.11.0"
+
+
+@nox.session
+def format(session):
+    session.install(BLACK_VERSION, ISORT_VERSION)
+    python_files = [path for path in os.listdir(".") if path.endswith(".py")]
+    session.run("isort", "--fss", *python_files)
+    session.run("black", *python_files)
+"""
+
+CUSTOM_NOXFILE = """
+import nox
+
+
+@nox.session
+def format(session):
+    session.run("black", "--line-length=100", ".", env={"A": "B"})
+"""
+
+
+def test_parse_format_session(tmp_path):
+    noxfile = tmp_path / "noxfile.py"
+    noxfile.write_text(LIBRARY_NOXFILE)
+    session = _python_formatter._parse_format_session(noxfile)
+    paths = ["docs", "google", "tests", "noxfile.py", "setup.py"]
+    assert session.commands == [
+        ("isort", ("--fss",), paths),
+        ("black", (), paths),
+    ]
+    assert session.pins == {"black": "23.7.0", "isort": "5.11.0"}
+
+    noxfile.write_text(SAMPLES_NOXFILE)
+    session = _python_formatter._parse_format_session(noxfile)
+    assert [command.paths for command in session.commands] == [
+        _python_formatter._TOP_LEVEL_PYTHON_FILES
+    ] * 2
+
+    noxfile.write_text(CUSTOM_NOXFILE)
+    assert _python_formatter._parse_format_session(noxfile) is None
+    noxfile.write_text("import nox\n")
+    assert _python_formatter._parse_format_session(noxfile) is None
+
+
+@pytest.fixture
+def installed_tools(monkeypatch):
+    versions = {"black": "23.7.0", "isort": "5.11.0"}
+    monkeypatch.setattr(_python_formatter, "_get_installed_version", versions.get)
+    return versions
+
+
+def _make_repo(root):
+    (root / "pyproject.toml").write_text("")
+    (root / "noxfile.py").write_text(LIBRARY_NOXFILE)
+    (root / "google").mkdir()
+    (root / "setup.py").write_text("")
+    for name in ["snippets", "other"]:
+        samples = root / "samples" / name
+        samples.mkdir(parents=True)
+        (samples / "noxfile.py").write_text(SAMPLES_NOXFILE)
+        (samples / "main.py").write_text("")
+    # Has a configuration of its own.
+    (root / "samples" / "other" / "setup.cfg").write_text("[isort]\n")
+    custom = root / "samples" / "custom"
+    custom.mkdir()
+    (custom / "noxfile.py").write_text(CUSTOM_NOXFILE)
+    return ["", "samples/snippets", "samples/other", "samples/custom"]
+
+
+def test_format_dirs_batches_directories(tmp_path, installed_tools):
+    dirs = [tmp_path / path for path in _make_repo(tmp_path)]
+    with mock.patch.object(_python_formatter._step_cache, "run") as run:
+        _python_formatter.format_dirs(dirs, root=tmp_path, jobs=1)
+
+    commands = {(call[1]["cwd"], *call[0][0]) for call in run.call_args_list}
+    isort = (sys.executable, "-m", "isort", "--fss", "--settings-path", ".")
+    black = (sys.executable, "-m", "black")
+    assert commands == {
+        (
+            str(tmp_path),
+            *isort,
+            "google",
+            "noxfile.py",
+            "setup.py",
+            "samples/snippets/main.py",
+            "samples/snippets/noxfile.py",
+        ),
+        (
+            str(tmp_path),
+            *black,
+            "google",
+            "noxfile.py",
+            "setup.py",
+            "samples/snippets/main.py",
+            "samples/snippets/noxfile.py",
+        ),
+        (str(tmp_path / "samples/other"), *isort, "main.py", "noxfile.py"),
+        (str(tmp_path / "samples/other"), *black, "main.py", "noxfile.py"),
+        (str(tmp_path / "samples/custom"), "nox", "-s", "format"),
+    }
+
+
+def test_format_dirs_respects_pins(tmp_path, installed_tools):
+    _make_repo(tmp_path)
+    installed_tools["black"] = "24.1.0"
+    with mock.patch.object(
+        _python_formatter, "_get_venv_python", return_value="/venv/bin/python"
+    ) as get_venv_python, mock.patch.object(
+        _python_formatter._step_cache, "run"
+    ) as run:
+        _python_formatter.format_dirs([tmp_path], root=tmp_path)
+    get_venv_python.assert_called_once_with(("black[jupyter]==23.7.0", "isort==5.11.0"))
+    assert [call[0][0][:3] for call in run.call_args_list] == [
+        ["/venv/bin/python", "-m", "isort"],
+        ["/venv/bin/python", "-m", "black"],
+    ]
+
+    # The pinned versions can't be installed.
+    with mock.patch.object(
+        _python_formatter, "_get_venv_python", return_value=None
+    ), mock.patch.object(_python_formatter._step_cache, "run") as run:
+        _python_formatter.format_dirs([tmp_path], root=tmp_path)
+    run.assert_called_once()
+    assert run.call_args[0][0] == ["nox", "-s", "format"]
+
+    # Without a virtualenv, nox would run the installed tools too.
+    with mock.patch.object(_python_formatter._step_cache, "run") as run:
+        _python_formatter.format_dirs([tmp_path], no_venv=True, root=tmp_path)
+    assert [call[0][0][2] for call in run.call_args_list] == ["isort", "black"]
+
+
+def test_format_dirs_only_written_files(tmp_path, installed_tools):
+    dirs = [tmp_path / path for path in _make_repo(tmp_path)]
+    (tmp_path / "google" / "client.py").write_text("")
+    (tmp_path / "google" / "data.json").write_text("")
+    only = [
+        str(tmp_path / "google" / "client.py"),
+        str(tmp_path / "google" / "data.json"),
+        str(tmp_path / "samples" / "custom" / "README.md"),
+    ]
+    with mock.patch.object(_python_formatter._step_cache, "run") as run:
+        _python_formatter.format_dirs(dirs, root=tmp_path, only=only)
+
+    commands = {(call[1]["cwd"], *call[0][0]) for call in run.call_args_list}
+    assert commands == {
+        (
+            str(tmp_path),
+            *(sys.executable, "-m", "isort", "--fss", "--filter-files"),
+            *("--settings-path", ".", "google/client.py"),
+        ),
+        (str(tmp_path), sys.executable, "-m", "black", "google/client.py"),
+    }
+
+    with mock.patch.object(_python_formatter._step_cache, "run") as run:
+        _python_formatter.format_dirs(dirs, root=tmp_path, only=[])
+    run.assert_not_called()
+
+
+def test_format_dirs_only_written_files_force_exclude(tmp_path, installed_tools):
+    dirs = [tmp_path / path for path in _make_repo(tmp_path)]
+    (tmp_path / "pyproject.toml").write_text(
+        '[tool.black]\nextend-exclude = "google/gapic/"\n'
+    )
+    (tmp_path / "google" / "client.py").write_text("")
+    with mock.patch.object(_python_formatter._step_cache, "run") as run:
+        _python_formatter.format_dirs(
+            dirs, root=tmp_path, only=[str(tmp_path / "google" / "client.py")]
+        )
+
+    black = [call[0][0] for call in run.call_args_list if call[0][0][2] == "black"]
+    assert black == [
+        [
+            *(sys.executable, "-m", "black"),
+            *("--force-exclude", "(?:google/gapic/)", "google/client.py"),
+        ]
+    ]
+
+
+def test_format_dirs_only_written_files_excluded_by_black(tmp_path):
+    (tmp_path / ".git").mkdir()
+    (tmp_path / "pyproject.toml").write_text(
+        "[tool.black]\n"
+        "extend-exclude = '''\n"
+        "(\n"
+        "  ^/generated/  # Not formatted\n"
+        ")\n"
+        "'''\n"
+    )
+    (tmp_path / "noxfile.py").write_text(
+        'def format(session):\n    session.run("black", "generated", "main.py")\n'
+    )
+    (tmp_path / "generated").mkdir()
+    (tmp_path / "generated" / "client.py").write_text("x=1\n")
+    (tmp_path / "main.py").write_text("x=1\n")
+    only = [str(tmp_path / "generated" / "client.py"), str(tmp_path / "main.py")]
+
+    _python_formatter.format_dirs([tmp_path], root=tmp_path, only=only)
+
+    assert (tmp_path / "generated" / "client.py").read_text() == "x=1\n"
+    assert (tmp_path / "main.py").read_text() == "x = 1\n"
+
+
+def test_get_venv_python(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "get_cache_dir", lambda: tmp_path)
+    _python_formatter._get_venv_python.cache_clear()
+    requirements = ("black==23.7.0", "isort==5.11.0")
+
+    def create_venv(args):
+        if args[1:3] == ["-m", "venv"]:
+            os.makedirs(args[3])
+
+    with mock.patch.object(
+        _python_formatter.shell, "run", side_effect=create_venv
+    ) as run:
+        python = _python_formatter._get_venv_python(requirements)
+    assert [call[0][0][1:3] for call in run.call_args_list] == [
+        ["-m", "venv"],
+        ["-m", "pip"],
+    ]
+    assert run.call_args[0][0][0] == python
+    assert run.call_args[0][0][-2:] == list(requirements)
+
+    # Later runs reuse the virtualenv.
+    _python_formatter._get_venv_python.cache_clear()
+    with mock.patch.object(_python_formatter.shell, "run") as run:
+        assert _python_formatter._get_venv_python(requirements) == python
+    run.assert_not_called()
+
+
+def test_get_venv_python_install_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "get_cache_dir", lambda: tmp_path)
+    _python_formatter._get_venv_python.cache_clear()
+    with mock.patch.object(
+        _python_formatter.shell,
+        "run",
+        side_effect=subprocess.CalledProcessError(1, "pip"),
+    ):
+        assert _python_formatter._get_venv_python(("black==0",)) is None
+    _python_formatter._get_venv_python.cache_clear()
+
+
+def test_group_overlapping():
+    groups = _python_formatter._group_overlapping(
+        [
+            ["/repo/google", "/repo/noxfile.py"],
+            ["/repo/samples/a/main.py"],
+            ["/repo/samples/b"],
+            ["/repo/google/client.py"],
+            ["/repo/samples/b/main.py", "/repo/samples/c/main.py"],
+            ["/repo/samples/c"],
+        ]
+    )
+    assert groups == [[0, 3], [1], [2, 4, 5]]
+
+
+def test_format_dirs_writes_output_of_each_batch(tmp_path, installed_tools):
+    dirs = [tmp_path / path for path in _make_repo(tmp_path)]
+
+    def run(args, cwd, **kwargs):
+        for line in range(20):
+            shell.get_redirected_output().write(f"{cwd} {args[2]} {line}\n")
+            time.sleep(0.001)
+
+    output = io.StringIO()
+    with mock.patch.object(
+        _python_formatter._step_cache, "run", side_effect=run
+    ), shell.redirect_output(output):
+        _python_formatter.format_dirs(dirs, root=tmp_path, jobs=4)
+
+    # The output of each batch isn't interleaved with the others'.
+    batches = [line.split()[0] for line in output.getvalue().splitlines()]
+    assert len(batches) == 20 * 5
+    runs = [batch for index, batch in enumerate(batches) if batches[index - 1] != batch]
+    assert len(runs) == len(set(runs)) == 3
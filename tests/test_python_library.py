@@ -12,13 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import importlib
 import os
 from pathlib import Path
+from unittest import mock
 import yaml
 
 import pytest
 
 from synthtool import gcp
+from synthtool.languages import python
 from synthtool.sources import templates
 from . import util
 
@@ -138,3 +141,20 @@ def test_split_system_tests():
         with open(templated_files / ".kokoro/presubmit/system-3.8.cfg", "r") as f:
             contents = f.read()
             assert "system-3.8" in contents
+
+
+def test_template_paths_resolved_lazily(tmp_path):
+    with mock.patch("synthtool.gcp.common.CommonTemplates") as common_templates:
+        common_templates.return_value._template_root = tmp_path
+        module = importlib.reload(python)
+        common_templates.assert_not_called()
+
+        assert module.SAMPLES_TEMPLATE_PATH == tmp_path / "python_samples"
+        assert module.SAMPLES_TEMPLATE_PATH == tmp_path / "python_samples"
+        assert module.NOTEBOOK_TEMPLATE_PATH == (
+            tmp_path / "python_notebooks_testing_pipeline"
+        )
+        common_templates.assert_called_once_with()
+    with pytest.raises(AttributeError):
+        module.UNKNOWN_TEMPLATE_PATH
+    importlib.reload(python)
@@ -58,3 +58,67 @@ def test_apply_workaround():
                 "packages/google-cloud-asset/scripts/client-post-processing",
                 "google-cloud-asset",
             )
+
+
+def test_owlbot_main_all_parallel_aggregates_failures(tmp_path, caplog):
+    with util.chdir(tmp_path):
+        for name in ("google-cloud-a", "google-cloud-b", "google-cloud-c"):
+            Path("packages", name).mkdir(parents=True)
+        # Packages without staging directories have nothing to copy.
+        for name in ("google-cloud-a", "google-cloud-c"):
+            Path("packages", name, ".repo-metadata.json").write_text(
+                '{"default_version": "v1"}'
+            )
+
+        with pytest.raises(RuntimeError) as excinfo:
+            python_mono_repo.owlbot_main_all(
+                [
+                    "packages/google-cloud-a",
+                    "packages/google-cloud-b",
+                    "packages/google-cloud-c",
+                ],
+                jobs=2,
+            )
+
+    assert "failed for 1 of 3 packages: packages/google-cloud-b" in str(excinfo.value)
+    assert "Could not find the default version" in caplog.text
+
+
+def test_walk_through_owlbot_dirs_changed_since(tmp_path):
+    for name in ("google-cloud-a", "google-cloud-b", "google-cloud-c"):
+        Path(tmp_path, "packages", name).mkdir(parents=True)
+        Path(tmp_path, "packages", name, ".OwlBot.yaml").write_text("")
+    util.make_feature_branch(tmp_path)
+    Path(tmp_path, "packages", "google-cloud-b", "setup.py").write_text("")
+    util.commit_all(tmp_path, "b")
+    Path(tmp_path, "owl-bot-staging", "google-cloud-c", "v1").mkdir(parents=True)
+
+    all_dirs = python_mono_repo.walk_through_owlbot_dirs(tmp_path)
+    assert len(all_dirs) == 3
+    changed_dirs = python_mono_repo.walk_through_owlbot_dirs(tmp_path, "main")
+    assert sorted(changed_dirs) == [
+        str(tmp_path / "packages" / "google-cloud-b"),
+        str(tmp_path / "packages" / "google-cloud-c"),
+    ]
+
+
+def test_walk_through_owlbot_dirs_changed_since_renamed_and_non_ascii(tmp_path):
+    for name in ("google-cloud-a", "google-cloud-b", "google-cloud-c"):
+        Path(tmp_path, "packages", name).mkdir(parents=True)
+        Path(tmp_path, "packages", name, ".OwlBot.yaml").write_text("")
+    Path(tmp_path, "packages", "google-cloud-a", "setup.py").write_text("a = 1\n")
+    util.make_feature_branch(tmp_path)
+    util.git(
+        tmp_path,
+        "mv",
+        "packages/google-cloud-a/setup.py",
+        "packages/google-cloud-b/setup.py",
+    )
+    Path(tmp_path, "packages", "google-cloud-c", "\u00e9.py").write_text("")
+    util.commit_all(tmp_path, "b")
+
+    changed_dirs = python_mono_repo.walk_through_owlbot_dirs(tmp_path, "main")
+    assert sorted(changed_dirs) == [
+        str(tmp_path / "packages" / name)
+        for name in ("google-cloud-a", "google-cloud-b", "google-cloud-c")
+    ]
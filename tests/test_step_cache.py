@@ -0,0 +1,128 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+from unittest import mock
+
+import pytest
+
+from synthtool import _step_cache, cache, shell
+
+# Upper-cases the .txt files below src into out, and removes stale.out.
+SCRIPT = """
+import os, pathlib
+for path in pathlib.Path("src").glob("**/*.txt"):
+    out = pathlib.Path("out") / path.relative_to("src")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(path.read_text().upper())
+if os.path.exists("stale.out"):
+    os.remove("stale.out")
+print("done")
+"""
+
+
+@pytest.fixture
+def step_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "get_cache_dir", lambda: tmp_path / "cache")
+    monkeypatch.setattr(_step_cache, "ENABLED", True)
+
+
+def _run(root, tool_version="1.0"):
+    return _step_cache.run(
+        [sys.executable, "-c", SCRIPT],
+        inputs=["src/*"],
+        outputs=["out/*", "*.out"],
+        tool_version=tool_version,
+        cwd=root,
+    )
+
+
+def _make_package(root):
+    (root / "src" / "a").mkdir(parents=True)
+    (root / "src" / "a" / "b.txt").write_text("hello")
+    (root / "node_modules" / "src").mkdir(parents=True)
+    (root / "node_modules" / "src" / "ignored.txt").write_text("ignored")
+    (root / "stale.out").write_text("stale")
+
+
+def test_restores_outputs(step_cache, tmp_path):
+    first = tmp_path / "first"
+    _make_package(first)
+    assert _run(first).stdout == "done\n"
+    assert (first / "out" / "a" / "b.txt").read_text() == "HELLO"
+
+    # Another package with the same inputs gets the same files.
+    second = tmp_path / "second"
+    _make_package(second)
+    with mock.patch.object(shell, "run") as run:
+        result = _run(second)
+    run.assert_not_called()
+    assert result.returncode == 0
+    assert result.stdout == "done\n"
+    assert (second / "out" / "a" / "b.txt").read_text() == "HELLO"
+    assert not (second / "stale.out").exists()
+
+
+def test_runs_on_changes(step_cache, tmp_path):
+    _make_package(tmp_path)
+    _run(tmp_path)
+
+    (tmp_path / "src" / "a" / "b.txt").write_text("bye")
+    assert _run(tmp_path).stdout == "done\n"
+    assert (tmp_path / "out" / "a" / "b.txt").read_text() == "BYE"
+
+    with mock.patch.object(shell, "run", wraps=shell.run) as run:
+        _run(tmp_path, tool_version="2.0")
+    run.assert_called_once()
+
+    # Files outside the patterns, or in dependency directories, don't matter.
+    (tmp_path / "README.md").write_text("readme")
+    (tmp_path / "node_modules" / "src" / "ignored.txt").write_text("changed")
+    with mock.patch.object(shell, "run") as run:
+        _run(tmp_path, tool_version="2.0")
+    run.assert_not_called()
+
+
+def test_disabled_without_tool_version(step_cache, tmp_path):
+    _make_package(tmp_path)
+    _run(tmp_path, tool_version=None)
+    with mock.patch.object(shell, "run", wraps=shell.run) as run:
+        _run(tmp_path, tool_version=None)
+    run.assert_called_once()
+
+
+def test_failed_steps_are_not_cached(step_cache, tmp_path):
+    (tmp_path / "src").mkdir()
+    args = [sys.executable, "-c", "import sys; sys.exit(1)"]
+    for _ in range(2):
+        with mock.patch.object(shell, "run", wraps=shell.run) as run:
+            result = _step_cache.run(
+                args, inputs=["src/*"], tool_version="1.0", cwd=tmp_path, check=False
+            )
+        run.assert_called_once()
+        assert result.returncode == 1
+
+
+def test_restored_output_is_written(step_cache, tmp_path, capsys):
+    _make_package(tmp_path)
+    for _ in range(2):
+        _step_cache.run(
+            [sys.executable, "-c", SCRIPT],
+            inputs=["src/*"],
+            outputs=["out/*", "*.out"],
+            tool_version="1.0",
+            cwd=tmp_path,
+            hide_output=False,
+        )
+        assert capsys.readouterr().out == "done\n"
@@ -12,10 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import stat
 import sys
 from pathlib import Path
+from unittest import mock
 
+import jinja2
+import pytest
+
+from synthtool import cache
 from synthtool.sources import templates
 
 
@@ -108,3 +114,176 @@ def test_hide_billing():
 def test_slugify():
     assert templates.slugify("Foo Bar") == "foo-bar"
     assert templates.slugify("ACL (Access Control)") == "acl-access-control"
+
+
+def test_bytecode_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "get_cache_dir", lambda: tmp_path)
+    location = tmp_path / "templates"
+    location.mkdir()
+    (location / "example.j2").write_text("Hello, {{ name }}!\n")
+
+    result = templates.Templates(location).render("example.j2", name="world")
+    assert result.read_text() == "Hello, world!\n"
+    entries = list((tmp_path / templates.BYTECODE_CACHE_NAMESPACE).glob("[!.]*"))
+    assert len(entries) == 1
+
+    # A new environment loads the compiled template instead of compiling it.
+    with mock.patch.object(jinja2.Environment, "compile") as compile:
+        result = templates.Templates(location).render("example.j2", name="again")
+    compile.assert_not_called()
+    assert result.read_text() == "Hello, again!\n"
+
+    # Changing the template invalidates the entry.
+    (location / "example.j2").write_text("Bye, {{ name }}!\n")
+    os.utime(location / "example.j2", ns=(0, 0))
+    result = templates.Templates(location).render("example.j2", name="world")
+    assert result.read_text() == "Bye, world!\n"
+
+
+def test_render_group_shares_environment():
+    first = templates.TemplateGroup(FIXTURES / "group")
+    first.render(var_a="hello", var_b="world")
+
+    second = templates.TemplateGroup(FIXTURES / "group", excludes=["1.txt.j2"])
+    assert second.env is first.env
+    with mock.patch.object(second.env, "list_templates") as list_templates:
+        result = second.render(var_a="hi", var_b="there")
+    list_templates.assert_not_called()
+    assert not (result / "1.txt").exists()
+    assert (result / "subdir" / "2.txt").read_text() == "there\n"
+
+
+def test_render_group_parallel_matches_serial():
+    location = Path(__file__).parent.parent / "synthtool/gcp/templates/python_samples"
+    kwargs = {"metadata": {"repo": {}}, "get_help": lambda filename: ""}
+    excludes = ["README.rst"]
+
+    serial = templates.TemplateGroup(location, excludes, jobs=1).render(**kwargs)
+    parallel = templates.TemplateGroup(location, excludes, jobs=8).render(**kwargs)
+
+    serial_files = sorted(p.relative_to(serial) for p in serial.glob("**/*"))
+    parallel_files = sorted(p.relative_to(parallel) for p in parallel.glob("**/*"))
+    assert serial_files == parallel_files
+    for path in serial_files:
+        if (serial / path).is_file():
+            assert (serial / path).read_bytes() == (parallel / path).read_bytes()
+            assert (serial / path).stat().st_mode == (parallel / path).stat().st_mode
+
+
+def _memo_templates(tmp_path):
+    location = tmp_path / "templates"
+    location.mkdir()
+    (location / "static.txt").write_text("Static\n")
+    (location / "name.txt.j2").write_text('{% include "_greeting" %}{{ name }}\n')
+    (location / "_greeting").write_text("{{ greeting }}, ")
+    (location / "help.txt.j2").write_text("{{ get_help('x') }}\n")
+    return location
+
+
+def test_render_memo_reuses_identical_output(tmp_path):
+    location = _memo_templates(tmp_path)
+    excludes = ["_greeting"]
+    kwargs = {"name": "world", "greeting": "Hello", "get_help": lambda x: x}
+    templates.TemplateGroup(location, excludes, jobs=1).render(**kwargs)
+
+    with mock.patch.object(
+        jinja2.Template, "render", autospec=True, side_effect=jinja2.Template.render
+    ) as render:
+        # Only the values a template reads are part of the key.
+        result = templates.TemplateGroup(location, excludes, jobs=1).render(
+            unused="changed", **kwargs
+        )
+    # The function passed in the context can't be identified.
+    assert [call.args[0].name for call in render.call_args_list] == ["help.txt.j2"]
+    assert (result / "static.txt").read_text() == "Static\n"
+    assert (result / "name.txt").read_text() == "Hello, world\n"
+    assert (result / "help.txt").read_text() == "x\n"
+
+
+def test_render_memo_detects_changes(tmp_path):
+    location = _memo_templates(tmp_path)
+    excludes = ["_greeting", "help.txt.j2"]
+    templates.TemplateGroup(location, excludes).render(name="world", greeting="Hello")
+
+    result = templates.TemplateGroup(location, excludes).render(
+        name="world", greeting="Bye"
+    )
+    assert (result / "name.txt").read_text() == "Bye, world\n"
+
+    # Changing an included template changes the output too.
+    (location / "_greeting").write_text("{{ greeting }}! ")
+    os.utime(location / "_greeting", ns=(0, 0))
+    result = templates.TemplateGroup(location, excludes).render(
+        name="world", greeting="Bye"
+    )
+    assert (result / "name.txt").read_text() == "Bye! world\n"
+
+
+def test_render_memo_persistent(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "get_cache_dir", lambda: tmp_path / "cache")
+    monkeypatch.setattr(templates, "PERSIST_RENDERS", True)
+    templates._renders.clear()
+    location = _memo_templates(tmp_path)
+    excludes = ["_greeting", "help.txt.j2"]
+    templates.TemplateGroup(location, excludes).render(name="world", greeting="Hi")
+
+    # Simulate a new process.
+    templates._renders.clear()
+    with mock.patch.object(jinja2.Template, "render") as render:
+        result = templates.TemplateGroup(location, excludes).render(
+            name="world", greeting="Hi"
+        )
+    render.assert_not_called()
+    assert (result / "name.txt").read_text() == "Hi, world\n"
+
+
+def test_to_json_distinguishes_types():
+    assert templates._to_json([1, "a"]) != templates._to_json((1, "a"))
+    assert templates._to_json({"a": 1, "b": 2}) != templates._to_json({"b": 2, "a": 1})
+    assert templates._to_json({1: "a"}) != templates._to_json({"1": "a"})
+    with pytest.raises(TypeError):
+        templates._to_json(object())
+
+
+def test_render_group_incremental(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "get_cache_dir", lambda: tmp_path / "cache")
+    location = _memo_templates(tmp_path)
+    destination = tmp_path / "dest"
+    destination.mkdir()
+    excludes = ["_greeting", "help.txt.j2"]
+
+    def render(**kwargs):
+        group = templates.TemplateGroup(location, excludes, destination=destination)
+        result = group.render(**kwargs)
+        for path in result.glob("**/*"):
+            if path.is_file():
+                (destination / path.relative_to(result)).write_bytes(path.read_bytes())
+        return result
+
+    templates._renders.clear()
+    render(name="world", greeting="Hi")
+
+    # Unchanged templates are copied from the destination.
+    templates._renders.clear()
+    with mock.patch.object(jinja2.Template, "render") as template_render:
+        result = render(name="world", greeting="Hi")
+    template_render.assert_not_called()
+    assert (result / "name.txt").read_text() == "Hi, world\n"
+    assert (result / "static.txt").read_text() == "Static\n"
+
+    # A changed context value re-renders only the templates reading it.
+    templates._renders.clear()
+    with mock.patch.object(
+        jinja2.Template, "render", autospec=True, side_effect=jinja2.Template.render
+    ) as template_render:
+        result = render(name="there", greeting="Hi")
+    assert [call.args[0].name for call in template_render.call_args_list] == [
+        "name.txt.j2"
+    ]
+    assert (result / "name.txt").read_text() == "Hi, there\n"
+
+    # A destination file edited since is rendered again.
+    (destination / "static.txt").write_text("Edited\n")
+    templates._renders.clear()
+    result = render(name="there", greeting="Hi")
+    assert (result / "static.txt").read_text() == "Static\n"
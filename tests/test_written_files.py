@@ -0,0 +1,71 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+
+import pytest
+
+from synthtool import _tracked_paths, _written_files, transforms
+from . import util
+
+
+@pytest.fixture(autouse=True)
+def reset_written_files():
+    _written_files.reset()
+    yield
+    _written_files.reset()
+
+
+def test_transforms_record_written_files(tmpdir):
+    with util.chdir(tmpdir):
+        os.makedirs("staging/src")
+        with open("staging/src/a.ts", "w") as f:
+            f.write("a")
+        with open("staging/b.ts", "w") as f:
+            f.write("b")
+        os.makedirs("library")
+        with open("library/c.ts", "w") as f:
+            f.write("c")
+        _tracked_paths.add("staging")
+
+        transforms.move(["staging/src"], "library/src")
+        transforms.move(["staging/b.ts"], "library")
+        assert _written_files.get() == [
+            os.path.abspath("library/b.ts"),
+            os.path.abspath("library/src/a.ts"),
+        ]
+
+        transforms.replace("library/c.ts", "missing", "x")
+        assert os.path.abspath("library/c.ts") not in _written_files.get()
+        transforms.replace("library/c.ts", "c", "x")
+        assert os.path.abspath("library/c.ts") in _written_files.get()
+
+        assert _written_files.get("library/src") == [
+            os.path.abspath("library/src/a.ts")
+        ]
+        assert _written_files.get("lib") == []
+
+
+def test_add_modified_since(tmp_path):
+    (tmp_path / "old.js").write_text("old")
+    os.utime(tmp_path / "old.js", ns=(0, 0))
+    (tmp_path / "node_modules").mkdir()
+    start = time.time_ns()
+    (tmp_path / "new.js").write_text("new")
+    os.utime(tmp_path / "new.js", ns=(start, start))
+    (tmp_path / "node_modules" / "dependency.js").write_text("dependency")
+
+    _written_files.add_modified_since(tmp_path, start)
+    assert _written_files.get(tmp_path) == [str(tmp_path / "new.js")]
@@ -124,3 +124,28 @@ def copied_fixtures_dir(source: pathlib.Path):
         workdir = shutil.copytree(source, pathlib.Path(tempdir) / "workspace")
         with chdir(workdir):
             yield workdir
+
+
+def git(repo: typing.Union[pathlib.Path, str], *args: str) -> str:
+    """Runs git in a test repo as a test user, and returns its output."""
+    return subprocess.run(
+        ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+        cwd=str(repo),
+        check=True,
+        capture_output=True,
+        encoding="utf-8",
+    ).stdout
+
+
+def commit_all(repo: typing.Union[pathlib.Path, str], message: str) -> None:
+    """Commits every file of a test repo."""
+    git(repo, "add", "-A")
+    git(repo, "commit", "-m", message)
+
+
+def make_feature_branch(repo: typing.Union[pathlib.Path, str]) -> None:
+    """Commits every file of a new repo to main, and checks out a feature
+    branch."""
+    git(repo, "init", "-b", "main")
+    commit_all(repo, "main")
+    git(repo, "checkout", "-b", "feature")